@@ -0,0 +1,232 @@
+"""
+Unique payment amount allocation.
+
+Each order pays its base amount plus a paise offset (1-99) so payments can be
+matched by amount. An offset is leased per base amount for the order's
+payment window: the lease is a document in `amount_leases` keyed by
+(base amount, offset), claimed with a single atomic upsert that only succeeds
+when the slot is free or its previous lease has expired.
+
+Every worker keeps a local map of slots it knows to be taken, so allocations
+usually succeed on the first claim; after a collision the map is refreshed
+from the database once, which keeps contention from turning into retry
+storms.
+
+allocate_many leases offsets for a whole batch of orders with one unordered
+bulk_write per round; only the claims that collided are retried.
+"""
+import logging
+import random
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+logger = logging.getLogger(__name__)
+
+
+LEASE_COLLECTION = "amount_leases"
+
+
+class AmountAllocationError(Exception):
+    """Raised when every paise offset for a base amount is leased"""
+
+
+def to_paise(amount: float) -> int:
+    return int(round(amount * 100))
+
+
+def generate_unique_amount(base_amount: float, paise_offset: int) -> float:
+    """Payment amount for a base amount and leased paise offset"""
+    return round(base_amount + paise_offset / 100.0, 2)
+
+
+def amount_offset(base_amount: float, unique_amount: float) -> int:
+    """Paise offset an order was allocated, recovered from its amounts"""
+    return to_paise(unique_amount) - to_paise(base_amount)
+
+
+class UniqueAmountAllocator:
+    """Leases paise offsets per base amount until the payment window closes"""
+
+    def __init__(self, db, max_offset: int = 99, max_claims: int = 8):
+        self.db = db
+        self.max_offset = max_offset
+        self.max_claims = max_claims
+        # base_paise -> {offset: lease expiry} for slots known to be taken
+        self._taken: Dict[int, Dict[int, datetime]] = {}
+        self.claims = 0
+        self.collisions = 0
+
+    @property
+    def collection(self):
+        return self.db[LEASE_COLLECTION]
+
+    def _known_taken(self, base_paise: int, now: datetime) -> Dict[int, datetime]:
+        taken = self._taken.setdefault(base_paise, {})
+        for offset in [o for o, expires_at in taken.items() if expires_at <= now]:
+            del taken[offset]
+        return taken
+
+    async def _refresh(self, base_paise: int, now: datetime) -> Dict[int, datetime]:
+        leases = await self.collection.find(
+            {"base_paise": base_paise, "expires_at": {"$gt": now}},
+            {"_id": 0, "offset": 1, "expires_at": 1}
+        ).to_list(self.max_offset)
+        taken = {lease['offset']: lease['expires_at'] for lease in leases}
+        self._taken[base_paise] = taken
+        return taken
+
+    async def _claim(self, base_paise: int, offset: int, holder: str, expires_at: datetime, now: datetime) -> bool:
+        """Atomically take the slot if it is free or its lease has expired"""
+        self.claims += 1
+        try:
+            await self.collection.update_one(
+                {"_id": f"{base_paise}:{offset}", "expires_at": {"$lte": now}},
+                {"$set": {
+                    "base_paise": base_paise,
+                    "offset": offset,
+                    "holder": holder,
+                    "expires_at": expires_at
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # A live lease exists, so the filter missed and the upsert hit the _id
+            self.collisions += 1
+            return False
+
+    async def allocate(self, base_amount: float, holder: str, expires_at: datetime) -> int:
+        """
+        Lease a free paise offset for base_amount until expires_at
+        Returns: the offset; raises AmountAllocationError when none is free
+        """
+        base_paise = to_paise(base_amount)
+        now = datetime.now(timezone.utc)
+        taken = self._known_taken(base_paise, now)
+        refreshed = False
+
+        for _ in range(self.max_claims):
+            free = [o for o in range(1, self.max_offset + 1) if o not in taken]
+            if not free:
+                if refreshed:
+                    break
+                taken = await self._refresh(base_paise, now)
+                refreshed = True
+                continue
+
+            offset = random.choice(free)
+            if await self._claim(base_paise, offset, holder, expires_at, now):
+                taken[offset] = expires_at
+                return offset
+
+            if refreshed:
+                # Lost a race with another worker; the slot is taken until it is released
+                taken[offset] = expires_at
+            else:
+                taken = await self._refresh(base_paise, now)
+                refreshed = True
+
+        raise AmountAllocationError(f"No unique amount available for base amount {base_amount}")
+
+    async def allocate_many(
+        self,
+        requests: List[Tuple[float, str]],
+        expires_at: datetime,
+    ) -> List[Optional[int]]:
+        """
+        Lease offsets for many (base_amount, holder) pairs until expires_at
+        Returns the offset for each request, or None where no offset was free
+        """
+        now = datetime.now(timezone.utc)
+        offsets: List[Optional[int]] = [None] * len(requests)
+        pending = list(range(len(requests)))
+        # Base amounts whose local map missed a lease, and those already re-read this call
+        stale: Set[int] = set()
+        refreshed: Set[int] = set()
+
+        for _ in range(self.max_claims):
+            for base_paise in stale - refreshed:
+                await self._refresh(base_paise, now)
+                refreshed.add(base_paise)
+            stale = set()
+
+            claims: List[Tuple[int, int, int]] = []
+            retry: List[int] = []
+            for index in pending:
+                base_paise = to_paise(requests[index][0])
+                taken = self._known_taken(base_paise, now)
+                free = [o for o in range(1, self.max_offset + 1) if o not in taken]
+                if not free:
+                    if base_paise not in refreshed:
+                        stale.add(base_paise)
+                        retry.append(index)
+                    continue
+                offset = random.choice(free)
+                # Mark it right away so the rest of the batch picks other offsets
+                taken[offset] = expires_at
+                claims.append((index, base_paise, offset))
+
+            collided = await self._claim_many(claims, requests, expires_at, now) if claims else set()
+            for position, (index, base_paise, offset) in enumerate(claims):
+                if position in collided:
+                    # Someone else holds it; the slot stays marked as taken
+                    retry.append(index)
+                    if base_paise not in refreshed:
+                        stale.add(base_paise)
+                else:
+                    offsets[index] = offset
+
+            pending = retry
+            if not pending:
+                break
+
+        return offsets
+
+    async def _claim_many(
+        self,
+        claims: List[Tuple[int, int, int]],
+        requests: List[Tuple[float, str]],
+        expires_at: datetime,
+        now: datetime,
+    ) -> Set[int]:
+        """Claim (index, base_paise, offset) slots in one bulk write; returns positions that collided"""
+        self.claims += len(claims)
+        operations = [
+            UpdateOne(
+                {"_id": f"{base_paise}:{offset}", "expires_at": {"$lte": now}},
+                {"$set": {
+                    "base_paise": base_paise,
+                    "offset": offset,
+                    "holder": requests[index][1],
+                    "expires_at": expires_at
+                }},
+                upsert=True
+            )
+            for index, base_paise, offset in claims
+        ]
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            self.collisions += len(errors)
+            return {error["index"] for error in errors}
+        return set()
+
+    async def release(self, base_amount: float, offset: int, holder: str):
+        """Give a slot back before its lease expires"""
+        base_paise = to_paise(base_amount)
+        await self.collection.delete_one({"_id": f"{base_paise}:{offset}", "holder": holder})
+        self._taken.get(base_paise, {}).pop(offset, None)
+
+    def stats(self) -> dict:
+        return {
+            "claims": self.claims,
+            "collisions": self.collisions,
+            "tracked_amounts": len(self._taken),
+        }
@@ -0,0 +1,116 @@
+"""
+Microbenchmark: inline vs offloaded Paytm checksum work.
+
+Runs N sign and verify operations through ChecksumExecutor in each mode at a
+given concurrency and reports throughput together with the worst event-loop
+lag seen by a 1 ms ticker running alongside, which is what the other requests
+on the worker experience.
+
+Usage (from the backend directory):
+    python benchmarks/checksum_offload.py [--ops 2000] [--concurrency 50] [--workers 4]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from checksum_pool import EXECUTOR_MODES, ChecksumExecutor, PaytmChecksum  # noqa: E402
+
+
+KEY = "BENCHMARKKEY1234"  # AES-128 needs a 16 byte key
+
+BODY = json.dumps({
+    "requestType": "Payment",
+    "mid": "TESTMERCHANT",
+    "websiteName": "WEBSTAGING",
+    "orderId": "ORD-1A2B3C4D",
+    "txnAmount": {"value": "499.37", "currency": "INR"},
+    "userInfo": {"custId": "CUST-001", "mobile": "9999999999"},
+    "callbackUrl": "http://localhost:8001/api/payment/callback",
+})
+
+CALLBACK = {
+    "ORDERID": "ORD-1A2B3C4D",
+    "TXNID": "20240101111212800110168123456789",
+    "TXNAMOUNT": "499.37",
+    "STATUS": "TXN_SUCCESS",
+    "RESPCODE": "01",
+    "RESPMSG": "Txn Success",
+    "MID": "TESTMERCHANT",
+    "CURRENCY": "INR",
+}
+
+
+async def loop_lag_probe(stop: asyncio.Event, interval: float = 0.001) -> float:
+    """Largest delay between when a 1 ms sleep should have woken up and when it did"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(executor: ChecksumExecutor, operation: str, ops: int, concurrency: int) -> dict:
+    checksum = PaytmChecksum.generateSignature(dict(CALLBACK), KEY) if operation == "verify" else None
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with slots:
+            if operation == "sign":
+                await executor.sign(BODY)
+            else:
+                await executor.verify(CALLBACK, checksum)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(ops)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_lag = await probe
+
+    return {"ops_per_sec": ops / elapsed, "max_loop_lag_ms": worst_lag * 1000}
+
+
+async def run_batch_verify(executor: ChecksumExecutor, ops: int) -> dict:
+    checksum = PaytmChecksum.generateSignature(dict(CALLBACK), KEY)
+    items = [(CALLBACK, checksum)] * ops
+    started = time.perf_counter()
+    results = await executor.verify_many(items)
+    elapsed = time.perf_counter() - started
+    assert all(results)
+    return {"ops_per_sec": ops / elapsed, "max_loop_lag_ms": float("nan")}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{args.ops} ops per run, concurrency {args.concurrency}, {args.workers} pool workers\n")
+    print(f"{'mode':<10}{'operation':<14}{'ops/s':>12}{'max loop lag (ms)':>20}")
+
+    for mode in EXECUTOR_MODES:
+        executor = ChecksumExecutor(KEY, mode=mode, max_workers=args.workers)
+        executor.start()
+        try:
+            # Warm up the pool so process start-up is not measured
+            await executor.sign(BODY)
+            for operation in ("sign", "verify"):
+                result = await run(executor, operation, args.ops, args.concurrency)
+                print(f"{mode:<10}{operation:<14}{result['ops_per_sec']:>12.0f}{result['max_loop_lag_ms']:>20.2f}")
+            result = await run_batch_verify(executor, args.ops)
+            print(f"{mode:<10}{'verify_many':<14}{result['ops_per_sec']:>12.0f}{'-':>20}")
+        finally:
+            executor.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""
+Benchmark: response_model serialization vs the fast JSON path.
+
+Builds order documents shaped like what Motor returns (tz-aware BSON dates,
+optional fields missing or null, gateway payloads), renders each one through
+FastAPI's own response pipeline and through fast_json and reports the time
+per response for both. tests/test_fast_json.py checks on every test run that
+the two produce identical bytes for these documents.
+
+Usage (from the backend directory):
+    python benchmarks/order_serialization.py [--orders 2000] [--rounds 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bson.tz_util import utc  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+# server.py needs these to import; nothing connects during the benchmark
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import fast_json  # noqa: E402
+from server import Order, PaymentStatusResponse, local_payment_status  # noqa: E402
+
+
+STATUSES = ["pending", "processing", "success", "failed", "expired"]
+
+
+def make_order(n: int) -> dict:
+    """An order as find_one returns it, with the variety real documents have"""
+    created_at = datetime(2024, 1, 1, tzinfo=utc) + timedelta(seconds=n * 37, milliseconds=n % 1000)
+    base_amount = random.choice([199.0, 499.0, 999.0, 1299.5, 24999.0])
+    status = STATUSES[n % len(STATUSES)]
+    order = {
+        "id": f"00000000-0000-4000-8000-{n:012d}",
+        "order_id": f"ORD-{n:08X}",
+        "product_id": f"prod-{n % 7}",
+        "product_name": "Wireless Headphones ™ – édition spéciale",
+        "base_amount": base_amount,
+        "unique_amount": round(base_amount + (n % 99 + 1) / 100, 2),
+        "status": status,
+        "payment_window_expires": created_at + timedelta(minutes=30),
+        "created_at": created_at,
+        "user_agent": "Mozilla/5.0 (X11; Linux x86_64)",
+    }
+    if n % 3:
+        order["ip_address"] = f"10.0.{n % 255}.{n % 253}"
+    if status in ("processing", "success", "failed"):
+        order["payment_method"] = "paytm"
+        order["transaction_token"] = f"token-{n}"
+    if status in ("success", "failed"):
+        order["payment_gateway_txn_id"] = f"2024010111121280011016{n:010d}"
+        order["verified_at"] = created_at + timedelta(minutes=2)
+        order["gateway_response"] = {
+            "ORDERID": order["order_id"],
+            "TXNAMOUNT": f"{order['unique_amount']:.2f}",
+            "STATUS": "TXN_SUCCESS" if status == "success" else "TXN_FAILURE",
+            "RESPMSG": "Txn Success",
+        }
+    if n % 11 == 0:
+        # Documents written before unique amounts were floats
+        order["base_amount"] = int(base_amount)
+    if n % 13 == 0:
+        # Gateway payloads may carry floats json.dumps and orjson print differently
+        order["gateway_response"] = {
+            "ORDERID": order["order_id"],
+            "big": 1e20,
+            "txnAmount": 1e-05,
+            "refunds": [{"amount": 2.5e-07}],
+        }
+    return order
+
+
+async def default_body(field, document) -> bytes:
+    """What FastAPI sends for a response_model endpoint returning the document"""
+    content = await serialize_response(field=field, response_content=document)
+    return JSONResponse(content).body
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(1)
+    orders = [make_order(n) for n in range(args.orders)]
+    statuses = [local_payment_status(order).model_dump() for order in orders]
+    # list_orders only takes the fast path when every order on the page is portable
+    page_orders = [order for order in orders if fast_json.portable(order)][:50]
+    page = {"orders": page_orders, "count": len(page_orders), "next_cursor": "cursor"}
+
+    order_field = create_response_field("Order", Order)
+    status_field = create_response_field("PaymentStatusResponse", PaymentStatusResponse)
+    order_encoder = fast_json.TrustedDocumentEncoder(Order)
+    status_encoder = fast_json.TrustedDocumentEncoder(PaymentStatusResponse)
+
+    fallbacks = sum(1 for order in orders if order_encoder.render(order) is None)
+    print(f"{len(orders)} orders, {fallbacks} of them sent through the model by the fast path")
+    print(f"Encoder: {'orjson' if fast_json.orjson is not None else 'json (orjson not installed)'}\n")
+
+    async def timed(render, documents) -> float:
+        best = float("inf")
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            for document in documents:
+                body = render(document)
+                if asyncio.iscoroutine(body):
+                    await body
+            best = min(best, time.perf_counter() - started)
+        return best / len(documents) * 1e6
+
+    cases = [
+        ("get_order", orders,
+         lambda d: default_body(order_field, d),
+         lambda d: order_encoder.render(d) or default_body(order_field, d)),
+        ("payment status", statuses,
+         lambda d: default_body(status_field, d), status_encoder.render),
+        ("admin page (50)", [page] * max(1, args.orders // 50),
+         lambda d: JSONResponse(jsonable_encoder(d)).body, fast_json.dumps),
+    ]
+    print(f"{'response':<18}{'default (us)':>14}{'fast (us)':>12}{'speedup':>10}")
+    for name, documents, default, fast in cases:
+        slow_us = await timed(default, documents)
+        fast_us = await timed(fast, documents)
+        print(f"{name:<18}{slow_us:>14.1f}{fast_us:>12.1f}{slow_us / fast_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
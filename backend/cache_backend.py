@@ -0,0 +1,304 @@
+"""
+Cache backends shared across workers.
+
+Each uvicorn worker has its own memory, so the in-process caches in server.py
+disagree with each other and every worker pays its own Mongo round trips.
+CacheBackend is the storage interface those caches sit on:
+
+- MemoryCacheBackend keeps entries in this process (the default, same
+  behaviour as before)
+- RedisCacheBackend stores BSON-encoded entries in Redis so every worker
+  shares them; redis is only imported when it is configured
+- FakeRedis is an in-process stand-in for the Redis client, so the Redis
+  code path (encoding, expiry, versions) runs in tests and local setups
+  without a server
+
+VersionedCache is one namespace on a backend with a default TTL. Besides
+per-key deletes, bumping the namespace version invalidates every entry at
+once; old entries are simply never read again and age out with their TTL.
+"""
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import bson
+from bson.codec_options import CodecOptions
+
+from cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_BACKENDS = ("memory", "redis", "fake")
+
+_DEFAULT_TTL = object()
+_CODEC_OPTIONS = CodecOptions(tz_aware=True)
+
+
+def encode_value(value: Any) -> bytes:
+    return bson.encode({"v": value})
+
+
+def decode_value(data: bytes) -> Any:
+    return bson.decode(data, codec_options=_CODEC_OPTIONS)["v"]
+
+
+class CacheBackend(ABC):
+    """Key-value storage with per-entry TTLs and atomic counters"""
+
+    name = "abstract"
+    # True when other workers see the same entries
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """The stored value, or None if missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store value; ttl=None keeps it until deleted or evicted"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    async def version(self, key: str) -> int:
+        """Current value of a counter (0 if never incremented)"""
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        """Atomically increment a counter and return the new value"""
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Entries in this process only"""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int = 20000, clock: Callable[[], float] = time.monotonic):
+        self._cache = TTLCache(maxsize=maxsize, clock=clock)
+        # Counters are not evictable, losing one would resurrect invalidated entries
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._cache.set(key, value, ttl=ttl)
+
+    async def delete(self, key: str):
+        self._cache.delete(key)
+
+    async def version(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self._cache.stats()}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Entries in Redis (or anything speaking the redis.asyncio client API)
+    Redis errors are logged and treated as misses so an outage degrades to Mongo reads
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, client, prefix: str = "techstore:"):
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "techstore:") -> "RedisCacheBackend":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package (pip install redis)")
+        return cls(redis.from_url(url), prefix=prefix)
+
+    def _failed(self, operation: str, key: str, error: Exception):
+        self.errors += 1
+        logger.warning("Cache backend %s failed for %s: %s", operation, key, error)
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            data = await self.client.get(self.prefix + key)
+        except Exception as e:
+            self._failed("get", key, e)
+            return None
+        return None if data is None else decode_value(data)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        px = None if ttl is None else max(1, int(ttl * 1000))
+        try:
+            await self.client.set(self.prefix + key, encode_value(value), px=px)
+        except Exception as e:
+            self._failed("set", key, e)
+
+    async def delete(self, key: str):
+        try:
+            await self.client.delete(self.prefix + key)
+        except Exception as e:
+            # The entry stays until its TTL runs out; nothing better to do without the server
+            logger.error("Cache backend delete failed for %s: %s", key, e)
+            self.errors += 1
+
+    async def version(self, key: str) -> int:
+        try:
+            data = await self.client.get(self.prefix + key)
+        except Exception as e:
+            self._failed("version", key, e)
+            return 0
+        return int(data) if data is not None else 0
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(self.prefix + key)
+
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or self.client.close
+        await close()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "errors": self.errors}
+
+
+class FakeRedis:
+    """In-process stand-in for the part of the redis.asyncio client RedisCacheBackend uses"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self._clock():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def set(self, key: str, value: bytes, px: Optional[int] = None) -> bool:
+        expires_at = None if px is None else self._clock() + px / 1000
+        self._data[key] = (bytes(value), expires_at)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key: str) -> int:
+        current = self._live(key)
+        value = int(current) + 1 if current is not None else 1
+        expires_at = self._data[key][1] if current is not None else None
+        self._data[key] = (str(value).encode(), expires_at)
+        return value
+
+    async def aclose(self):
+        self._data.clear()
+
+
+def cache_backend_from_env() -> CacheBackend:
+    """Build the backend named by CACHE_BACKEND (memory, redis or fake)"""
+    kind = os.environ.get('CACHE_BACKEND', 'memory').lower()
+    prefix = os.environ.get('CACHE_KEY_PREFIX', 'techstore:')
+    if kind == "memory":
+        return MemoryCacheBackend(maxsize=int(os.environ.get('CACHE_MEMORY_SIZE', 20000)))
+    if kind == "redis":
+        return RedisCacheBackend.from_url(os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'), prefix=prefix)
+    if kind == "fake":
+        return RedisCacheBackend(FakeRedis(), prefix=prefix)
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+class VersionedCache:
+    """
+    One namespace of entries on a backend, with a default TTL
+    The namespace version is re-read at most every version_ttl seconds, so an
+    invalidate_all() from another worker takes effect here within that time
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        namespace: str,
+        ttl: Optional[float] = None,
+        version_ttl: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self._clock = clock
+        self._version = 0
+        self._version_checked: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _version_key(self) -> str:
+        return f"{self.namespace}:version"
+
+    async def _current_version(self) -> int:
+        now = self._clock()
+        if self._version_checked is None or now - self._version_checked >= self.version_ttl:
+            self._version = await self.backend.version(self._version_key)
+            self._version_checked = now
+        return self._version
+
+    async def _key(self, key: Hashable) -> str:
+        if isinstance(key, tuple):
+            key = ":".join(str(part) for part in key)
+        return f"{self.namespace}:{await self._current_version()}:{key}"
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        value = await self.backend.get(await self._key(key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    async def set(self, key: Hashable, value: Any, ttl: Any = _DEFAULT_TTL):
+        """Store value; ttl=None keeps it until invalidated, omitted uses the namespace default"""
+        if ttl is _DEFAULT_TTL:
+            ttl = self.ttl
+        await self.backend.set(await self._key(key), value, ttl=ttl)
+
+    async def delete(self, key: Hashable):
+        await self.backend.delete(await self._key(key))
+
+    async def invalidate_all(self):
+        """Drop every entry in the namespace, on every worker sharing the backend"""
+        self._version = await self.backend.incr(self._version_key)
+        self._version_checked = self._clock()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
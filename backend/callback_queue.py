@@ -0,0 +1,270 @@
+"""
+Durable ingestion queue for Paytm callbacks.
+
+In queue mode the callback handler only verifies the checksum, appends the
+raw callback to the `callback_queue` collection and redirects the customer.
+A pool of async workers claims queued callbacks in batches, applies them to
+their orders concurrently and acknowledges the whole batch with one write,
+so callback latency stays flat however slow the orders collection gets.
+
+When verification is deferred, the handler stores the callback together with
+its checksum and workers verify each claimed batch in one pool job before
+applying it; entries with a bad checksum are parked as `dead`.
+
+Entries left `processing` by a worker that died are picked up again once
+their lease runs out. Entries that keep failing are retried with backoff and
+parked as `dead` after max_attempts.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+
+logger = logging.getLogger(__name__)
+
+
+QUEUE_COLLECTION = "callback_queue"
+
+
+class CallbackQueue:
+    """Mongo-backed callback queue drained by async workers"""
+
+    def __init__(
+        self,
+        db,
+        apply_callback: Callable[[dict], Awaitable[Optional[str]]],
+        verify_batch: Optional[Callable[[List[Tuple[dict, str]]], Awaitable[List[bool]]]] = None,
+        workers: int = 4,
+        batch_size: int = 50,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 5,
+        retry_backoff: float = 5.0,
+    ):
+        self.db = db
+        self.apply_callback = apply_callback
+        self.verify_batch = verify_batch
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self.enqueued = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, db, apply_callback, verify_batch=None) -> "CallbackQueue":
+        """Build a queue from CALLBACK_QUEUE_* environment variables"""
+        return cls(
+            db,
+            apply_callback,
+            verify_batch=verify_batch,
+            workers=int(os.environ.get('CALLBACK_QUEUE_WORKERS', 4)),
+            batch_size=int(os.environ.get('CALLBACK_QUEUE_BATCH_SIZE', 50)),
+            poll_interval=float(os.environ.get('CALLBACK_QUEUE_POLL_INTERVAL', 1)),
+            lease_seconds=float(os.environ.get('CALLBACK_QUEUE_LEASE', 60)),
+            max_attempts=int(os.environ.get('CALLBACK_QUEUE_MAX_ATTEMPTS', 5)),
+        )
+
+    @property
+    def collection(self):
+        return self.db[QUEUE_COLLECTION]
+
+    async def enqueue(self, paytm_params: dict, checksum: Optional[str] = None) -> bool:
+        """
+        Durably append a callback; pass its checksum to have the workers verify it
+        Returns False if the same callback (order, transaction, status) is already queued
+        """
+        now = datetime.now(timezone.utc)
+        dedup_key = ":".join(
+            str(paytm_params.get(field, "")) for field in ("ORDERID", "TXNID", "STATUS")
+        )
+        entry = {
+            "params": paytm_params,
+            "state": "queued",
+            "attempts": 0,
+            "enqueued_at": now,
+            "available_at": now
+        }
+        if checksum is not None:
+            # Unverified data must not be able to shadow the genuine callback's dedup key
+            dedup_key = f"{dedup_key}:{checksum}"
+            entry["checksum"] = checksum
+        entry["dedup_key"] = dedup_key
+        try:
+            await self.collection.insert_one(entry)
+        except DuplicateKeyError:
+            self.duplicates += 1
+            return False
+        self.enqueued += 1
+        self._wakeup.set()
+        return True
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info("Callback queue started (%s workers, batch_size=%s)", self.workers, self.batch_size)
+
+    async def stop(self):
+        if not self._tasks:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        tasks, self._tasks = self._tasks, []
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Callback queue stopped")
+
+    async def _worker(self, number: int):
+        while not self._stopping.is_set():
+            try:
+                handled = await self.drain_once()
+            except Exception as e:
+                logger.exception("Callback queue worker %s failed: %s", number, e)
+                handled = 0
+
+            if handled:
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> List[dict]:
+        """Claim up to batch_size entries for this worker with three round trips"""
+        now = datetime.now(timezone.utc)
+        claimable = {
+            "$or": [
+                {"state": "queued", "available_at": {"$lte": now}},
+                # Lease ran out: the worker that claimed it is gone
+                {"state": "processing", "locked_until": {"$lte": now}}
+            ]
+        }
+        candidates = await self.collection.find(claimable, {"_id": 1}).sort(
+            "enqueued_at", ASCENDING
+        ).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+
+        claim = uuid.uuid4().hex
+        await self.collection.update_many(
+            {"$and": [claimable, {"_id": {"$in": [c["_id"] for c in candidates]}}]},
+            {
+                "$set": {
+                    "state": "processing",
+                    "claim": claim,
+                    "locked_until": now + timedelta(seconds=self.lease_seconds)
+                },
+                "$inc": {"attempts": 1}
+            }
+        )
+        # Other workers may have won some candidates; only keep what this claim got
+        return await self.collection.find({"claim": claim}).to_list(self.batch_size)
+
+    async def drain_once(self) -> int:
+        """Claim and apply one batch; returns the number of entries handled"""
+        claimed = await self._claim()
+        if not claimed:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        done = []
+        operations = []
+
+        entries = await self._verify(claimed, operations, now)
+        results = await asyncio.gather(
+            *[self.apply_callback(entry["params"]) for entry in entries],
+            return_exceptions=True
+        )
+
+        for entry, result in zip(entries, results):
+            if isinstance(result, Exception):
+                self.failed += 1
+                order_id = entry["params"].get("ORDERID")
+                logger.error("Queued callback for %s failed (attempt %s): %s", order_id, entry['attempts'], result)
+                if entry["attempts"] >= self.max_attempts:
+                    operations.append(UpdateOne(
+                        {"_id": entry["_id"]},
+                        {"$set": {"state": "dead", "error": str(result), "completed_at": now}}
+                    ))
+                else:
+                    retry_at = now + timedelta(seconds=self.retry_backoff * (2 ** (entry["attempts"] - 1)))
+                    operations.append(UpdateOne(
+                        {"_id": entry["_id"]},
+                        {"$set": {"state": "queued", "available_at": retry_at, "error": str(result)}}
+                    ))
+            elif result is None:
+                # Verified callback for an order we do not know; keep it for investigation
+                operations.append(UpdateOne(
+                    {"_id": entry["_id"]},
+                    {"$set": {"state": "dead", "error": "Order not found", "completed_at": now}}
+                ))
+            else:
+                done.append(entry["_id"])
+
+        if done:
+            await self.collection.update_many(
+                {"_id": {"$in": done}},
+                {"$set": {"state": "done", "completed_at": now}, "$unset": {"claim": "", "locked_until": ""}}
+            )
+            self.processed += len(done)
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+        return len(claimed)
+
+    async def _verify(self, entries: List[dict], operations: list, now: datetime) -> List[dict]:
+        """Batch-verify entries queued with a checksum; bad ones are parked as dead"""
+        unverified = [entry for entry in entries if "checksum" in entry]
+        if not unverified:
+            return entries
+        if self.verify_batch is None:
+            raise RuntimeError("Callback queue has unverified entries but no verify_batch")
+
+        results = await self.verify_batch([(entry["params"], entry["checksum"]) for entry in unverified])
+        rejected = {entry["_id"] for entry, ok in zip(unverified, results) if not ok}
+        for entry_id in rejected:
+            operations.append(UpdateOne(
+                {"_id": entry_id},
+                {"$set": {"state": "dead", "error": "Invalid checksum", "completed_at": now}}
+            ))
+        if rejected:
+            self.rejected += len(rejected)
+            logger.error("Rejected %s queued callbacks with invalid checksums", len(rejected))
+        return [entry for entry in entries if entry["_id"] not in rejected]
+
+    async def depth(self) -> dict:
+        """Entries per state, for monitoring"""
+        rows = await self.collection.aggregate([
+            {"$match": {"state": {"$in": ["queued", "processing", "dead"]}}},
+            {"$group": {"_id": "$state", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        counts = {"queued": 0, "processing": 0, "dead": 0}
+        counts.update({row["_id"]: row["count"] for row in rows})
+        return counts
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,192 @@
+"""
+Circuit breaker and adaptive timeouts for outbound calls.
+
+CircuitBreaker watches the outcomes of recent calls in a sliding time window.
+Once enough calls have been seen and too many of them failed or were slow,
+it opens and callers fail fast for open_seconds instead of queueing behind a
+degraded dependency. It then goes half-open and lets a few probe calls
+through: if they all succeed quickly it closes, otherwise it opens again.
+
+AdaptiveTimeout derives a call's read timeout from the observed p99 latency
+of recent successful calls, so a brownout is cut off after a few multiples of
+normal latency rather than the full static timeout.
+"""
+import logging
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Failure-rate and slow-call-rate breaker with half-open probing"""
+
+    def __init__(
+        self,
+        name: str = "circuit",
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_call_rate: float = 0.8,
+        min_calls: int = 10,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        # (finished_at, ok, slow) per call in the window
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probes_passed = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probes_passed = 0
+        return self._state
+
+    @property
+    def rejecting(self) -> bool:
+        """True while allow() would refuse a call"""
+        state = self.state
+        if state == HALF_OPEN:
+            return self._probes_in_flight + self._probes_passed >= self.half_open_probes
+        return state == OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; every allowed call must be followed by record() or cancel()"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes_in_flight + self._probes_passed < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, ok: bool, latency: float):
+        """Report the outcome of an allowed call"""
+        now = self._clock()
+        slow = latency >= self.slow_call_seconds
+
+        if self._state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if not ok or slow:
+                logger.warning("%s circuit probe failed, reopening for %ss", self.name, self.open_seconds)
+                self._open(now)
+                return
+            self._probes_passed += 1
+            if self._probes_passed >= self.half_open_probes:
+                self._state = CLOSED
+                self._calls.clear()
+                logger.info("%s circuit closed after %s successful probes", self.name, self._probes_passed)
+            return
+        if self._state == OPEN:
+            # A call that started before the breaker opened
+            return
+
+        self._calls.append((now, ok, slow))
+        while self._calls and self._calls[0][0] <= now - self.window_seconds:
+            self._calls.popleft()
+
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+        slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+        if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+            logger.warning(
+                "%s circuit opened for %ss: %s/%s failed, %s/%s slow in the last %ss",
+                self.name, self.open_seconds, failures, total, slow_calls, total, self.window_seconds
+            )
+            self._open(now)
+
+    def cancel(self):
+        """Report an allowed call that was abandoned before it had an outcome"""
+        if self._state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.times_opened += 1
+
+    def stats(self) -> dict:
+        total = len(self._calls)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_failures": sum(1 for _, ok, _ in self._calls if not ok),
+            "window_slow_calls": sum(1 for _, _, slow in self._calls if slow),
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+
+
+class AdaptiveTimeout:
+    """Read timeout of multiplier x observed p99, clamped to [min_timeout, max_timeout]"""
+
+    def __init__(
+        self,
+        min_timeout: float = 2.0,
+        max_timeout: float = 30.0,
+        multiplier: float = 3.0,
+        samples: int = 500,
+        min_samples: int = 50,
+    ):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self._latencies: Deque[float] = deque(maxlen=samples)
+        self._cached: Optional[float] = None
+
+    def observe(self, latency: float):
+        """Record the latency of a successful call"""
+        self._latencies.append(latency)
+        self._cached = None
+
+    def p99(self) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(0.99 * len(ordered)) - 1)]
+
+    def timeout(self) -> float:
+        """Timeout for the next call; the static maximum until enough samples are in"""
+        if len(self._latencies) < self.min_samples:
+            return self.max_timeout
+        if self._cached is None:
+            self._cached = min(self.max_timeout, max(self.min_timeout, self.p99() * self.multiplier))
+        return self._cached
+
+    def stats(self) -> dict:
+        p99 = self.p99()
+        return {
+            "samples": len(self._latencies),
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "timeout_s": round(self.timeout(), 3),
+        }
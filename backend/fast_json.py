@@ -0,0 +1,184 @@
+"""
+Fast-path JSON for order responses.
+
+Endpoints with a response_model make FastAPI validate the document it just
+read from Mongo, serialize it back to a dict, run jsonable_encoder over that
+and finally json.dumps it. For documents this service wrote itself that work
+is redundant. TrustedDocumentEncoder renders such a document straight to the
+bytes FastAPI would have produced: fields in model order, missing optional
+fields filled with their defaults, floats coerced, datetimes formatted the way
+pydantic formats them. Documents it cannot vouch for (missing required
+fields, unexpected types, floats orjson prints differently) return None so
+the caller falls back to the normal response_model path.
+
+orjson is used when installed, otherwise the stdlib encoder with FastAPI's
+own settings. benchmarks/order_serialization.py checks the output is
+byte-identical to the default path.
+"""
+import json
+import typing
+from datetime import datetime
+from typing import Any, List, Optional, Tuple, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Floats orjson and json.dumps print identically (no exponent notation)
+_PORTABLE_FLOAT_MIN = 1e-4
+_PORTABLE_FLOAT_MAX = 1e16
+# orjson only handles 64 bit integers
+_PORTABLE_INT_MAX = 2 ** 63 - 1
+
+_KINDS = (str, int, float, bool, datetime, dict)
+
+
+def _isoformat(value: Any) -> Any:
+    # jsonable_encoder, which FastAPI applies to endpoints without a response_model
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _pydantic_format(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any, utc_z: bool = False) -> bytes:
+    """
+    Encode content exactly as FastAPI's JSONResponse would after jsonable_encoder
+    With utc_z, datetimes are formatted as pydantic's json mode does instead
+    """
+    if orjson is not None:
+        # orjson's native datetime output matches isoformat(), and pydantic with OPT_UTC_Z
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z if utc_z else 0)
+    return json.dumps(
+        content,
+        default=_pydantic_format if utc_z else _isoformat,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def portable(document: dict) -> bool:
+    """True if every number, including those in nested dicts and lists, encodes the same with orjson and json.dumps"""
+    if orjson is None:
+        return True
+    return _portable_values(document.values())
+
+
+def _portable_values(values) -> bool:
+    for value in values:
+        if isinstance(value, float):
+            if value and not _PORTABLE_FLOAT_MIN <= abs(value) < _PORTABLE_FLOAT_MAX:
+                return False
+        elif isinstance(value, int):
+            if abs(value) > _PORTABLE_INT_MAX:
+                return False
+        elif isinstance(value, dict):
+            if not _portable_values(value.values()):
+                return False
+        elif isinstance(value, (list, tuple)):
+            if not _portable_values(value):
+                return False
+    return True
+
+
+def format_datetime(value: datetime) -> str:
+    """ISO 8601 as pydantic serializes it: UTC offsets are written as Z"""
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+class FastJSONResponse(Response):
+    """JSONResponse rendered with dumps()"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class TrustedDocumentEncoder:
+    """Renders documents read from Mongo as a response_model would, without validating them"""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        # (name, kind, optional, has_default, default)
+        self._fields: List[Tuple[str, type, bool, bool, Any]] = []
+        for name, field in model.model_fields.items():
+            kind, optional = self._field_kind(field.annotation)
+            has_default = not field.is_required() and field.default_factory is None
+            self._fields.append((name, kind, optional, has_default, field.default))
+
+    @staticmethod
+    def _field_kind(annotation) -> Tuple[type, bool]:
+        optional = False
+        if typing.get_origin(annotation) is typing.Union:
+            args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+            optional = len(args) < len(typing.get_args(annotation))
+            if len(args) != 1:
+                raise TypeError(f"Unsupported field type for fast serialization: {annotation}")
+            annotation = args[0]
+        annotation = typing.get_origin(annotation) or annotation
+        if annotation not in _KINDS:
+            raise TypeError(f"Unsupported field type for fast serialization: {annotation}")
+        return annotation, optional
+
+    def prepare(self, document: dict) -> Optional[dict]:
+        """The document in response_model shape, or None if it needs validating"""
+        prepared = {}
+        for name, kind, optional, has_default, default in self._fields:
+            if name in document:
+                value = document[name]
+            elif has_default:
+                value = default
+            else:
+                return None
+
+            if value is None:
+                if not optional:
+                    return None
+            elif kind is float:
+                if type(value) not in (float, int):
+                    return None
+                value = float(value)
+            elif kind is datetime:
+                if not isinstance(value, datetime):
+                    return None
+            elif kind is dict:
+                if not isinstance(value, dict):
+                    return None
+            elif type(value) is not kind:
+                return None
+            prepared[name] = value
+
+        if not portable(prepared):
+            return None
+        return prepared
+
+    def render(self, document: dict) -> Optional[bytes]:
+        """Response body for a document, or None if it must go through the model"""
+        prepared = self.prepare(document)
+        if prepared is None:
+            return None
+        try:
+            return dumps(prepared, utc_z=True)
+        except TypeError:
+            # Something inside a dict field only pydantic knows how to serialize
+            return None
+
+    def response(self, document: dict) -> Optional[Response]:
+        body = self.render(document)
+        if body is None:
+            return None
+        return Response(content=body, media_type="application/json")
@@ -0,0 +1,116 @@
+"""
+MongoDB index definitions.
+
+Every index the API relies on is declared here and ensured on startup.
+ensure_indexes is idempotent: indexes that already exist are left alone and
+the returned report lists what was created, what already existed and what
+could not be built.
+"""
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+
+logger = logging.getLogger(__name__)
+
+
+ORDER_INDEXES = [
+    # Point lookups from every order/payment endpoint, and the uniqueness guarantee for ORD-xxxxxxxx ids
+    IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+    # Admin listing, newest first, optionally filtered by status or product (keyset on created_at, order_id)
+    IndexModel([("created_at", DESCENDING), ("order_id", DESCENDING)], name="created_at_order_id"),
+    IndexModel(
+        [("status", ASCENDING), ("created_at", DESCENDING), ("order_id", DESCENDING)],
+        name="status_created_at_order_id",
+    ),
+    IndexModel(
+        [("product_id", ASCENDING), ("created_at", DESCENDING), ("order_id", DESCENDING)],
+        name="product_id_created_at_order_id",
+    ),
+    # Reconciler scan for processing orders that are due for a check
+    IndexModel([("status", ASCENDING), ("reconcile_next_at", ASCENDING)], name="status_reconcile_next_at"),
+    # Expiry sweeper scan for pending/processing orders past their payment window
+    IndexModel(
+        [("status", ASCENDING), ("payment_window_expires", ASCENDING)],
+        name="status_payment_window_expires",
+    ),
+    # Gateway transaction lookups; most orders have no transaction id yet
+    IndexModel(
+        [("payment_gateway_txn_id", ASCENDING)],
+        name="payment_gateway_txn_id",
+        partialFilterExpression={"payment_gateway_txn_id": {"$type": "string"}},
+    ),
+]
+
+STATUS_CHECK_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    IndexModel([("timestamp", DESCENDING)], name="timestamp"),
+]
+
+ORDER_STATS_INDEXES = [
+    # One rollup document per (hour, product); upserts rely on this being unique
+    IndexModel([("hour", ASCENDING), ("product_id", ASCENDING)], name="hour_product_id_unique", unique=True),
+]
+
+AMOUNT_LEASE_INDEXES = [
+    # Allocator refresh: live leases for one base amount
+    IndexModel([("base_paise", ASCENDING), ("expires_at", ASCENDING)], name="base_paise_expires_at"),
+    # Let Mongo delete leases once the payment window has passed
+    IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+]
+
+CALLBACK_QUEUE_INDEXES = [
+    # Paytm retries of a callback that is already queued are dropped on insert
+    IndexModel([("dedup_key", ASCENDING)], name="dedup_key_unique", unique=True),
+    # Worker claims: due queued entries and expired leases, oldest first
+    IndexModel(
+        [("state", ASCENDING), ("available_at", ASCENDING), ("enqueued_at", ASCENDING)],
+        name="state_available_at",
+    ),
+    IndexModel([("state", ASCENDING), ("locked_until", ASCENDING)], name="state_locked_until"),
+    IndexModel([("claim", ASCENDING)], name="claim", sparse=True),
+    # Finished entries are kept for a week for auditing
+    IndexModel([("completed_at", ASCENDING)], name="completed_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+]
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "orders": ORDER_INDEXES,
+    "status_checks": STATUS_CHECK_INDEXES,
+    "order_stats_hourly": ORDER_STATS_INDEXES,
+    "amount_leases": AMOUNT_LEASE_INDEXES,
+    "callback_queue": CALLBACK_QUEUE_INDEXES,
+}
+
+
+async def ensure_indexes(db, indexes: Dict[str, List[IndexModel]] = INDEXES) -> dict:
+    """
+    Create any missing indexes
+    Returns: {collection: {"created": [...], "existing": [...], "failed": {name: error}}}
+    """
+    report = {}
+    for collection_name, models in indexes.items():
+        collection = db[collection_name]
+        existing = set((await collection.index_information()).keys())
+        result = {"created": [], "existing": [], "failed": {}}
+
+        for model in models:
+            name = model.document["name"]
+            if name in existing:
+                result["existing"].append(name)
+                continue
+            try:
+                await collection.create_indexes([model])
+                result["created"].append(name)
+            except OperationFailure as e:
+                # e.g. duplicate keys blocking a unique index; keep going with the rest
+                logger.error("Failed to create index %s.%s: %s", collection_name, name, e)
+                result["failed"][name] = str(e)
+
+        report[collection_name] = result
+        logger.info(
+            "Indexes on %s: created=%s, existing=%s, failed=%s",
+            collection_name, result['created'], len(result['existing']), list(result['failed'])
+        )
+    return report
@@ -0,0 +1,66 @@
+"""
+Serve server.py for a load test, on a real MongoDB or an in-memory one.
+
+--mongo memory swaps Motor's client for mongomock_motor before server.py is
+imported, so nothing else needs to be running; it is limited to one worker
+because every worker would get its own empty database. Any other value is
+used as MONGO_URL.
+
+Usage (from the backend directory):
+    python loadtest/app.py --port 9000 --mongo memory
+    python loadtest/app.py --port 9000 --mongo mongodb://localhost:27017 --workers 4
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--mongo", default="memory", help="'memory' or a MongoDB URL")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    os.environ.setdefault("DB_NAME", "techstore_loadtest")
+    if args.mongo != "memory":
+        os.environ["MONGO_URL"] = args.mongo
+        uvicorn.run(
+            "server:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            app_dir=str(BACKEND_DIR),
+            log_level="warning",
+            access_log=False,
+        )
+        return
+
+    if args.workers != 1:
+        parser.error("--mongo memory runs a single worker")
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        parser.error("--mongo memory needs mongomock-motor (pip install mongomock-motor)")
+
+    import motor.motor_asyncio
+
+    motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    os.environ["MONGO_URL"] = "mongodb://in-memory"
+    # mongomock has no change streams
+    os.environ["ORDER_CACHE_CHANGE_STREAM"] = "false"
+
+    import server
+
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
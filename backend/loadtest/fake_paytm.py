@@ -0,0 +1,128 @@
+"""
+Local stand-in for the Paytm initiateTransaction and order status APIs.
+
+Answers like the staging gateway does, after an injected delay:
+- --latency-ms / --jitter-ms: uniform delay around a base latency
+- --slow-rate / --slow-ms: occasional slow responses, for tail latency
+- --error-rate: HTTP 500 with a non-JSON body
+- --timeout-rate: never answers within any sane client timeout
+- --status-result: resultStatus of order status responses (PENDING by default,
+  so the callback decides the outcome)
+
+Usage (from the backend directory):
+    python loadtest/fake_paytm.py --port 9100 --latency-ms 120 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+
+STATUS_RESULTS = ("PENDING", "TXN_SUCCESS", "TXN_FAILURE")
+
+
+def create_app(
+    latency_ms: float = 100.0,
+    jitter_ms: float = 30.0,
+    slow_rate: float = 0.0,
+    slow_ms: float = 2000.0,
+    error_rate: float = 0.0,
+    timeout_rate: float = 0.0,
+    status_result: str = "PENDING",
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    counters = {"initiate": 0, "status": 0, "errors": 0, "timeouts": 0}
+
+    async def inject() -> Optional[PlainTextResponse]:
+        """Sleep for the simulated latency; returns an error response to send instead, if any"""
+        roll = rng.random()
+        if roll < timeout_rate:
+            counters["timeouts"] += 1
+            await asyncio.sleep(300)
+        delay = latency_ms + rng.uniform(-jitter_ms, jitter_ms)
+        if rng.random() < slow_rate:
+            delay = slow_ms
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        if roll < timeout_rate + error_rate:
+            counters["errors"] += 1
+            return PlainTextResponse("Internal Server Error", status_code=500)
+        return None
+
+    @app.post("/theia/api/v1/initiateTransaction")
+    async def initiate_transaction(request: Request):
+        counters["initiate"] += 1
+        await request.json()
+        error = await inject()
+        if error is not None:
+            return error
+        return JSONResponse({
+            "head": {"responseTimestamp": "0", "version": "v1", "signature": "fake"},
+            "body": {
+                "resultInfo": {"resultStatus": "S", "resultCode": "0000", "resultMsg": "Success"},
+                "txnToken": uuid.uuid4().hex,
+                "isPromoCodeValid": False,
+                "authenticated": False,
+            },
+        })
+
+    @app.post("/order/status")
+    async def order_status(request: Request):
+        counters["status"] += 1
+        payload = await request.json()
+        error = await inject()
+        if error is not None:
+            return error
+        body = payload.get("body", {})
+        return JSONResponse({
+            "head": {"responseTimestamp": "0", "version": "v1", "signature": "fake"},
+            "body": {
+                "resultInfo": {"resultStatus": status_result, "resultCode": "01", "resultMsg": status_result},
+                "mid": body.get("mid"),
+                "orderId": body.get("orderId"),
+            },
+        })
+
+    @app.get("/stats")
+    async def stats():
+        return counters
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--status-result", choices=STATUS_RESULTS, default="PENDING")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        status_result=args.status_result,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
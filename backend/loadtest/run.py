@@ -0,0 +1,388 @@
+"""
+Load test: a mixed order/payment workload at a fixed arrival rate.
+
+Starts the fake Paytm server and the app (see fake_paytm.py and app.py),
+waits until both answer, then starts flows at --rps for --duration seconds
+after a --warmup that is not recorded. Arrivals are open-loop: a flow starts
+on schedule whether or not earlier ones have finished, so a slow server shows
+up as latency instead of quietly lowering the request rate.
+
+Flows, picked by --mix weights:
+- checkout: create order -> initiate payment -> status check (pending, asks
+  Paytm) -> signed Paytm callback -> status check (settled, answered locally)
+- browse: GET /orders/{id} for an existing order
+- poll: payment status of an existing order
+
+Reports throughput plus count, error rate and p50/p90/p99/max latency per
+step and per flow; --json writes the same numbers with the configuration and
+git commit so runs can be compared across changes.
+
+Usage (from the backend directory):
+    python loadtest/run.py --rps 50 --duration 60
+    python loadtest/run.py --rps 200 --mongo mongodb://localhost:27017 --workers 4 \\
+        --paytm-latency-ms 300 --paytm-error-rate 0.02 --json results/baseline.json
+    python loadtest/run.py --target http://localhost:8001 --paytm-key ...   # an already running app
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+try:
+    import PaytmChecksum
+except ImportError:
+    from paytmchecksum import PaytmChecksum
+
+
+LOADTEST_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = LOADTEST_DIR.parent
+
+FLOWS = ("checkout", "browse", "poll")
+PRODUCTS = [("prod-1", "Wireless Headphones", 1299.0), ("prod-2", "USB-C Charger", 499.0), ("prod-3", "Laptop Stand", 2499.0)]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in FLOWS:
+            raise argparse.ArgumentTypeError(f"unknown flow {name!r}, expected one of {', '.join(FLOWS)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Recorder:
+    """Latencies and failures per step, only while recording is on"""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, latency: float, error: Optional[str] = None):
+        if not self.recording:
+            return
+        self.latencies[name].append(latency)
+        if error:
+            self.errors[name][error] += 1
+
+    def summary(self) -> Dict[str, dict]:
+        rows = {}
+        for name, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+            failed = sum(self.errors[name].values())
+            rows[name] = {
+                "count": len(ordered),
+                "errors": failed,
+                "error_rate": round(failed / len(ordered), 4),
+                "error_kinds": dict(self.errors[name]),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+                "p90_ms": round(percentile(ordered, 0.90) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        return rows
+
+
+class Workload:
+    """The three flows against one app, recording every step"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, paytm_key: str, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.paytm_key = paytm_key
+        self.rng = rng
+        # Orders browse and poll flows pick from, most recent last
+        self.order_ids: List[str] = []
+
+    async def step(self, name: str, method: str, url: str, expect: int, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(name, time.perf_counter() - started, type(e).__name__)
+            raise StepFailed(name) from e
+        latency = time.perf_counter() - started
+        if response.status_code != expect:
+            self.recorder.record(name, latency, f"HTTP {response.status_code}")
+            raise StepFailed(name)
+        self.recorder.record(name, latency)
+        return response
+
+    def signed_callback(self, order_id: str, amount: float, success: bool) -> dict:
+        params = {
+            "ORDERID": order_id,
+            "MID": "TESTMERCHANT",
+            "TXNID": f"LT{self.rng.getrandbits(48):012d}",
+            "TXNAMOUNT": f"{amount:.2f}",
+            "STATUS": "TXN_SUCCESS" if success else "TXN_FAILURE",
+            "RESPCODE": "01" if success else "227",
+            "RESPMSG": "Txn Success" if success else "Txn Failed",
+            "PAYMENTMODE": "UPI",
+            "CURRENCY": "INR",
+        }
+        params["CHECKSUMHASH"] = PaytmChecksum.generateSignature(params, self.paytm_key)
+        return params
+
+    async def create_order(self) -> dict:
+        product_id, product_name, amount = self.rng.choice(PRODUCTS)
+        response = await self.step(
+            "create_order", "POST", "/api/orders", 200,
+            json={"product_id": product_id, "product_name": product_name, "amount": amount},
+        )
+        order = response.json()
+        self.order_ids.append(order["order_id"])
+        if len(self.order_ids) > 5000:
+            del self.order_ids[:1000]
+        return order
+
+    async def checkout(self):
+        order = await self.create_order()
+        order_id = order["order_id"]
+        await self.step(
+            "initiate_payment", "POST", "/api/payment/initiate", 200,
+            json={
+                "order_id": order_id,
+                "customer_id": f"cust-{self.rng.randrange(10000)}",
+                "customer_email": "loadtest@example.com",
+                "customer_mobile": "9876543210",
+            },
+        )
+        await self.step("status_pending", "GET", f"/api/payment/status/{order_id}", 200)
+        callback = self.signed_callback(order_id, order["unique_amount"], success=self.rng.random() < 0.9)
+        await self.step("callback", "POST", "/api/payment/callback", 307, data=callback)
+        await self.step("status_settled", "GET", f"/api/payment/status/{order_id}", 200)
+
+    async def browse(self):
+        if not self.order_ids:
+            await self.create_order()
+            return
+        await self.step("get_order", "GET", f"/api/orders/{self.rng.choice(self.order_ids)}", 200)
+
+    async def poll(self):
+        if not self.order_ids:
+            await self.create_order()
+            return
+        # Skewed towards recent orders, the way customers poll right after paying
+        index = len(self.order_ids) - 1 - min(len(self.order_ids) - 1, int(self.rng.expovariate(1 / 50)))
+        await self.step("poll_status", "GET", f"/api/payment/status/{self.order_ids[index]}", 200)
+
+    async def run_flow(self, name: str):
+        started = time.perf_counter()
+        try:
+            await getattr(self, name)()
+        except StepFailed as e:
+            self.recorder.record(f"flow:{name}", time.perf_counter() - started, f"{e} failed")
+            return
+        self.recorder.record(f"flow:{name}", time.perf_counter() - started)
+
+
+async def drive(args, base_url: str) -> dict:
+    """Run warmup and the measured phase; returns the report"""
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.request_timeout) as client:
+        workload = Workload(client, recorder, args.paytm_key, rng)
+        in_flight = set()
+        skipped = 0
+        measured_started = None
+        interval = 1 / args.rps
+        total = int((args.warmup + args.duration) * args.rps)
+        started = time.perf_counter()
+
+        for i in range(total):
+            scheduled = started + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if measured_started is None and i >= args.warmup * args.rps:
+                recorder.recording = True
+                measured_started = time.perf_counter()
+            if len(in_flight) >= args.max_in_flight:
+                # The generator, not the server, is the limit; count it instead of queueing
+                skipped += recorder.recording
+                continue
+            task = asyncio.create_task(workload.run_flow(rng.choices(names, weights)[0]))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.wait(in_flight)
+        elapsed = time.perf_counter() - (measured_started or started)
+
+    steps = recorder.summary()
+    flows = {name: row for name, row in steps.items() if name.startswith("flow:")}
+    completed = sum(row["count"] for row in flows.values())
+    failed = sum(row["errors"] for row in flows.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "flows": completed,
+        "flows_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+        "flow_error_rate": round(failed / completed, 4) if completed else 0.0,
+        "skipped_max_in_flight": skipped,
+        "steps": steps,
+    }
+
+
+def start_process(argv: List[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *argv], cwd=BACKEND_DIR, env=env)
+
+
+async def wait_until_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode} before answering")
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict):
+    print(
+        f"\n{report['flows']} flows in {report['elapsed_s']}s = {report['flows_per_s']} flows/s, "
+        f"flow error rate {report['flow_error_rate']:.2%}, "
+        f"{report['skipped_max_in_flight']} skipped at max in-flight\n"
+    )
+    print(f"{'step':<22}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in report["steps"].items():
+        print(
+            f"{name:<22}{row['count']:>8}{row['errors']:>8}"
+            f"{row['p50_ms']:>10}{row['p90_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}"
+        )
+        for kind, count in row["error_kinds"].items():
+            print(f"{'':<4}{kind}: {count}")
+
+
+async def main_async(args) -> dict:
+    processes: List[subprocess.Popen] = []
+    try:
+        if args.target:
+            base_url = args.target.rstrip("/")
+        else:
+            paytm_port = free_port()
+            app_port = free_port()
+            processes.append(start_process([
+                str(LOADTEST_DIR / "fake_paytm.py"),
+                "--port", str(paytm_port),
+                "--latency-ms", str(args.paytm_latency_ms),
+                "--jitter-ms", str(args.paytm_jitter_ms),
+                "--slow-rate", str(args.paytm_slow_rate),
+                "--slow-ms", str(args.paytm_slow_ms),
+                "--error-rate", str(args.paytm_error_rate),
+                "--timeout-rate", str(args.paytm_timeout_rate),
+                "--seed", str(args.seed),
+            ], dict(os.environ)))
+            await wait_until_ready(f"http://127.0.0.1:{paytm_port}/stats", processes[-1])
+
+            # Settings already in the environment win, so other configurations can be load tested too
+            env = {
+                "PAYTM_KEY": args.paytm_key,
+                "PAYTM_MID": "TESTMERCHANT",
+                "LOG_LEVEL": "WARNING",
+                "DB_NAME": f"techstore_loadtest_{int(time.time())}",
+                **os.environ,
+                "PAYTM_TXN_URL": f"http://127.0.0.1:{paytm_port}/theia/api/v1/initiateTransaction",
+                "PAYTM_STATUS_URL": f"http://127.0.0.1:{paytm_port}/order/status",
+            }
+            processes.append(start_process([
+                str(LOADTEST_DIR / "app.py"),
+                "--port", str(app_port),
+                "--workers", str(args.workers),
+                "--mongo", args.mongo,
+            ], env))
+            base_url = f"http://127.0.0.1:{app_port}"
+            await wait_until_ready(f"{base_url}/api/", processes[-1])
+
+        return await drive(args, base_url)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rps", type=float, default=20.0, help="flows started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unrecorded seconds before measuring")
+    parser.add_argument("--mix", type=parse_mix, default="checkout=0.4,browse=0.3,poll=0.3")
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--target", help="URL of an already running app; nothing is started")
+    parser.add_argument("--mongo", default="memory", help="'memory' or a MongoDB URL")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (needs a real MongoDB)")
+    parser.add_argument("--paytm-key", default="LOADTESTKEY12345", help="merchant key used to sign callbacks")
+    parser.add_argument("--paytm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--paytm-jitter-ms", type=float, default=30.0)
+    parser.add_argument("--paytm-slow-rate", type=float, default=0.0)
+    parser.add_argument("--paytm-slow-ms", type=float, default=2000.0)
+    parser.add_argument("--paytm-error-rate", type=float, default=0.0)
+    parser.add_argument("--paytm-timeout-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    if args.json:
+        config = {key: value for key, value in vars(args).items() if key not in ("json", "paytm_key")}
+        path = Path(args.json)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"commit": git_commit(), "config": config, **report}, indent=2))
+        print(f"\nReport written to {path}")
+
+
+if __name__ == "__main__":
+    main()
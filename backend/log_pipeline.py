@@ -0,0 +1,237 @@
+"""
+Non-blocking structured logging.
+
+Request handlers only put log records on a bounded queue; a QueueListener
+thread formats them and does the I/O. Messages use %-style arguments, so the
+string is built in the listener thread, and not at all for INFO records that
+the sampling filter drops before they are queued. The exception is a record
+with a dict or list argument: the caller may change it before the listener
+gets to it, so that message is formatted when it is queued, which is cheaper
+than copying the container.
+
+Records are written as one JSON object per line (LOG_FORMAT=text keeps the
+old format). Paytm secrets are redacted wherever they appear:
+txnToken, CHECKSUMHASH, transaction tokens and signatures by key in dict
+arguments and extra fields, and by pattern in the formatted message
+(the only place left for them once a message is formatted early). Mobile
+numbers are masked down to their last four digits.
+
+If the queue is full, records are dropped and counted rather than blocking the
+event loop.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, List, Optional
+
+
+REDACTED = "[REDACTED]"
+
+REDACT_KEYS = frozenset(key.lower() for key in (
+    "txnToken",
+    "CHECKSUMHASH",
+    "transaction_token",
+    "token",
+    "signature",
+    "mobile",
+    "customer_mobile",
+    "MOBILE_NO",
+))
+
+# key: value / key=value pairs that survived into a formatted string
+_SECRET_IN_TEXT = re.compile(
+    r"""(['"]?(?:txnToken|CHECKSUMHASH|transaction_token|token|signature|customer_mobile|mobile|MOBILE_NO)['"]?"""
+    r"""\s*[:=]\s*['"]?)[^'",}\s&]+""",
+    re.IGNORECASE,
+)
+# Indian mobile numbers, optionally with +91; not a run inside a longer number such as a TXNID
+_MOBILE_NUMBER = re.compile(r"(?<!\d)(?:\+?91[\s-]?)?[6-9]\d{5}(\d{4})(?!\d)")
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def redact_text(text: str) -> str:
+    text = _SECRET_IN_TEXT.sub(lambda m: m.group(1) + REDACTED, text)
+    return _MOBILE_NUMBER.sub(lambda m: "XXXXXX" + m.group(1), text)
+
+
+def redact(value: Any) -> Any:
+    """Copy of value with secret fields replaced and mobile numbers masked"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and key.lower() in REDACT_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+class RedactingFormatter(logging.Formatter):
+    """The classic text format, redacted"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.args, tuple):
+            record.args = tuple(redact(arg) for arg in record.args)
+        elif isinstance(record.args, dict):
+            record.args = redact(record.args)
+        return redact_text(super().format(record))
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, message, extra fields and exception"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.args, tuple):
+            record.args = tuple(redact(arg) for arg in record.args)
+        elif isinstance(record.args, dict):
+            record.args = redact(record.args)
+
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact_text(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = REDACTED if key.lower() in REDACT_KEYS else redact(value)
+        if record.exc_info:
+            entry["exc_info"] = redact_text(self.formatException(record.exc_info))
+        elif record.exc_text:
+            entry["exc_info"] = redact_text(record.exc_text)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of INFO and DEBUG records; warnings and errors always pass
+    Log with extra={"sample": False} to keep a specific INFO record regardless
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or self.rate >= 1.0 or not getattr(record, "sample", True):
+            return True
+        if random.random() < self.rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Queues records without formatting them; drops instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        args = record.args
+        # Containers may be changed by the caller before the listener thread formats them
+        if isinstance(args, dict) or (isinstance(args, tuple) and any(isinstance(arg, (dict, list)) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Routes the root logger through a queue to handlers running on a listener thread"""
+
+    def __init__(
+        self,
+        level: int = logging.INFO,
+        fmt: str = "json",
+        sample_rate: float = 1.0,
+        queue_size: int = 10000,
+        log_file: Optional[str] = None,
+    ):
+        self.level = level
+        self.fmt = fmt
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.log_file = log_file
+        self.sampler = SamplingFilter(sample_rate)
+        self.handler: Optional[AsyncQueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+
+    @classmethod
+    def from_env(cls) -> "LogPipeline":
+        """Build a pipeline from LOG_* environment variables"""
+        return cls(
+            level=logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper()),
+            fmt=os.environ.get('LOG_FORMAT', 'json').lower(),
+            sample_rate=float(os.environ.get('LOG_INFO_SAMPLE_RATE', 1.0)),
+            queue_size=int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+            log_file=os.environ.get('LOG_FILE') or None,
+        )
+
+    def _formatter(self) -> logging.Formatter:
+        if self.fmt == "text":
+            return RedactingFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        return JSONFormatter()
+
+    def _handlers(self) -> List[logging.Handler]:
+        handlers: List[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+        if self.log_file:
+            handlers.append(logging.FileHandler(self.log_file, encoding="utf-8"))
+        formatter = self._formatter()
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        return handlers
+
+    def start(self):
+        """Replace the root logger's handlers with the queue"""
+        if self._listener is not None:
+            return
+        log_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self.handler = AsyncQueueHandler(log_queue)
+        self.handler.addFilter(self.sampler)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+
+        self._listener = QueueListener(log_queue, *self._handlers(), respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        if self._listener is None:
+            return
+        listener, self._listener = self._listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "dropped_queue_full": self.handler.dropped if self.handler else 0,
+            "dropped_sampling": self.sampler.dropped,
+        }
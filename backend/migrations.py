@@ -0,0 +1,130 @@
+"""
+One-shot data migrations.
+
+migrate_datetimes converts datetime fields that older releases stored as ISO
+strings into native BSON dates. It walks each collection in _id order,
+converts a batch at a time with one bulk_write, and is safe to re-run.
+
+--rebuild-order-stats backfills the hourly order rollups from the orders
+collection (run it once after enabling /admin/stats, while traffic is low).
+
+Usage (from the backend directory):
+    python migrations.py [--batch-size 500] [--dry-run] [--rebuild-order-stats]
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from order_stats import OrderStatsRollup
+
+
+logger = logging.getLogger(__name__)
+
+
+DATETIME_FIELDS: Dict[str, List[str]] = {
+    "orders": ["created_at", "payment_window_expires", "verified_at"],
+    "status_checks": ["timestamp"],
+}
+
+
+def parse_iso_datetime(value: str) -> Optional[datetime]:
+    """Parse an ISO 8601 string, treating naive values as UTC; None if unparseable"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def migrate_collection_datetimes(
+    collection,
+    fields: List[str],
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> dict:
+    """Convert string datetimes in `fields` of one collection, batch by batch"""
+    summary = {"scanned": 0, "updated": 0, "unparseable": 0}
+    string_filter = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+    last_id = None
+
+    while True:
+        query = string_filter if last_id is None else {"$and": [string_filter, {"_id": {"$gt": last_id}}]}
+        docs = await collection.find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+
+        operations = []
+        for doc in docs:
+            converted = {}
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                parsed = parse_iso_datetime(value)
+                if parsed is None:
+                    summary["unparseable"] += 1
+                    logger.warning("Unparseable %s.%s on %s: %r", collection.name, field, doc['_id'], value)
+                    continue
+                converted[field] = parsed
+            if converted:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": converted}))
+
+        summary["scanned"] += len(docs)
+        if operations and not dry_run:
+            result = await collection.bulk_write(operations, ordered=False)
+            summary["updated"] += result.modified_count
+        elif dry_run:
+            summary["updated"] += len(operations)
+
+    return summary
+
+
+async def migrate_datetimes(db, batch_size: int = 500, dry_run: bool = False) -> dict:
+    """Run the datetime migration over every collection in DATETIME_FIELDS"""
+    report = {}
+    for collection_name, fields in DATETIME_FIELDS.items():
+        report[collection_name] = await migrate_collection_datetimes(
+            db[collection_name], fields, batch_size=batch_size, dry_run=dry_run
+        )
+        logger.info("Datetime migration %s: %s", collection_name, report[collection_name])
+    return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Convert ISO string datetimes to BSON dates")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Count documents without writing")
+    parser.add_argument("--rebuild-order-stats", action="store_true", help="Recompute hourly order rollups")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        report = await migrate_datetimes(db, batch_size=args.batch_size, dry_run=args.dry_run)
+        if args.rebuild_order_stats and not args.dry_run:
+            report["order_stats_hourly"] = {
+                "buckets": await OrderStatsRollup(db).rebuild(batch_size=args.batch_size)
+            }
+    finally:
+        client.close()
+
+    for collection_name, summary in report.items():
+        print(f"{collection_name}: {summary}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,198 @@
+"""
+Read-through order cache.
+
+get_order is polled by the checkout, success and failure pages, so the same
+few orders are read over and over. OrderCache keeps recently read order
+documents in a bounded LRU (cache.TTLCache) in front of db.orders.
+
+Every write path in server.py ends in notify_order_update, which
+invalidates the order here. That only reaches the worker that made the
+write, so unless the change stream watcher is on (it drops an order from
+every worker's cache as soon as Mongo reports it changed; change streams
+need a replica set) or entries live in a shared backend, ORDER_CACHE_TTL
+defaults to one second: other workers may serve an order at most that long
+after it changed.
+
+With a shared cache backend, orders are read from there before going to
+Mongo, so a burst of reads across workers costs one query. The local LRU is
+then skipped, since another worker's invalidation could not reach it, unless
+the change stream keeps it in step. Shared entries are keyed by a per-order
+generation that invalidate() replaces: a worker that read the order from
+Mongo just before an update stores its copy under the old generation, where
+no reader looks any more.
+"""
+import asyncio
+import logging
+import os
+import sys
+import uuid
+from typing import Any, Dict, Optional
+
+from pymongo.errors import PyMongoError
+
+from cache import TTLCache
+from cache_backend import VersionedCache
+from singleflight import SingleFlight
+
+
+logger = logging.getLogger(__name__)
+
+
+def deep_sizeof(value: Any) -> int:
+    """Approximate memory held by a document, including nested containers"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k) + deep_sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(deep_sizeof(item) for item in value)
+    return size
+
+
+class OrderCache:
+    """Bounded LRU of order documents, read through from db.orders"""
+
+    def __init__(
+        self,
+        db,
+        maxsize: int = 10000,
+        ttl: Optional[float] = 30.0,
+        watch: bool = False,
+        retry_delay: float = 5.0,
+        shared: Optional[VersionedCache] = None,
+    ):
+        self.db = db
+        self.shared = shared
+        # Outlives every entry stored under it, so an expired generation never uncovers an old entry
+        self._generations = VersionedCache(
+            shared.backend, f"{shared.namespace}_generation", ttl=2 * ttl if ttl else None
+        ) if shared else None
+        self.watch = watch
+        self.retry_delay = retry_delay
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Local copies only when something invalidates them on every worker, or there is no other tier
+        self.local = shared is None or watch
+        self._flight = SingleFlight()
+        # Change events only carry _id, so remember which order each cached _id belongs to
+        self._order_ids: Dict[Any, str] = {}
+        self._invalidations = 0
+        self._task: Optional[asyncio.Task] = None
+        self.change_events = 0
+
+    @classmethod
+    def from_env(cls, db, backend=None) -> "OrderCache":
+        """Build a cache from ORDER_CACHE_* environment variables, sharing entries if backend is shared"""
+        watch = os.environ.get('ORDER_CACHE_CHANGE_STREAM', 'false').lower() == 'true'
+        shared = backend is not None and backend.shared
+        ttl = float(os.environ.get('ORDER_CACHE_TTL', 30 if watch or shared else 1))
+        ttl = ttl if ttl > 0 else None
+        return cls(
+            db,
+            maxsize=int(os.environ.get('ORDER_CACHE_SIZE', 10000)),
+            ttl=ttl,
+            watch=watch,
+            shared=VersionedCache(backend, "orders", ttl=ttl) if shared else None,
+        )
+
+    async def get(self, order_id: str) -> Optional[dict]:
+        """The order document (without _id), from the cache or the database"""
+        if self.local:
+            order = self._cache.get(order_id)
+            if order is not None:
+                return order
+        return await self._flight.do(order_id, lambda: self._load(order_id))
+
+    async def _shared_key(self, order_id: str) -> tuple:
+        return order_id, await self._generations.get(order_id, "0")
+
+    async def _load(self, order_id: str) -> Optional[dict]:
+        invalidations = self._invalidations
+        shared_key = order = None
+        if self.shared:
+            shared_key = await self._shared_key(order_id)
+            order = await self.shared.get(shared_key)
+        from_db = order is None
+        if from_db:
+            order = await self.db.orders.find_one({"order_id": order_id})
+            if order is None:
+                return None
+
+        object_id = order.pop("_id")
+        # An invalidation during the read may mean this copy is already stale
+        if invalidations == self._invalidations:
+            if self.local:
+                self._cache.set(order_id, order)
+                self._order_ids[object_id] = order_id
+                if len(self._order_ids) > 2 * self._cache.maxsize:
+                    self._prune_order_ids()
+            if from_db and self.shared:
+                await self.shared.set(shared_key, {**order, "_id": object_id})
+        return order
+
+    def _prune_order_ids(self):
+        self._order_ids = {
+            object_id: order_id for object_id, order_id in self._order_ids.items()
+            if order_id in self._cache
+        }
+
+    async def invalidate(self, order_id: str):
+        self._invalidations += 1
+        self._cache.delete(order_id)
+        if self.shared:
+            await self._generations.set(order_id, uuid.uuid4().hex)
+
+    def clear(self):
+        """Drop this worker's copies; shared entries are invalidated per order"""
+        self._invalidations += 1
+        self._cache.clear()
+        self._order_ids.clear()
+
+    async def start(self):
+        if not self.watch or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._watch())
+        logger.info("Order cache change stream started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info("Order cache change stream stopped")
+
+    async def _watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["update", "replace", "delete", "invalidate", "drop"]}}}]
+        while True:
+            try:
+                async with self.db.orders.watch(pipeline) as stream:
+                    # Anything written while the stream was down may be cached stale
+                    self.clear()
+                    async for change in stream:
+                        self.change_events += 1
+                        await self._apply_change(change)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.error("Order cache change stream failed, retrying in %ss: %s", self.retry_delay, e)
+            await asyncio.sleep(self.retry_delay)
+
+    async def _apply_change(self, change: dict):
+        if change["operationType"] in ("invalidate", "drop"):
+            self.clear()
+            return
+        order_id = self._order_ids.pop(change["documentKey"]["_id"], None)
+        if order_id is not None:
+            await self.invalidate(order_id)
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["memory_bytes"] = sum(deep_sizeof(key) + deep_sizeof(value) for key, value in self._cache.items())
+        stats["local"] = self.local
+        stats["change_stream"] = self._task is not None
+        stats["change_events"] = self.change_events
+        if self.shared:
+            stats["shared"] = self.shared.stats()
+        return stats
@@ -0,0 +1,48 @@
+"""
+In-process pub/sub for order status changes.
+
+Write paths publish an event whenever they move an order to a new status;
+streaming clients subscribe per order_id and receive the event immediately
+instead of polling the database.
+"""
+import asyncio
+import json
+from typing import Dict, Optional, Set
+
+
+class OrderEventBroker:
+    """Fan out order status events to per-order subscriber queues"""
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, order_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(order_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, order_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(order_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[order_id]
+
+    def publish(self, order_id: str, event: dict):
+        for queue in self._subscribers.get(order_id, ()):
+            if queue.full():
+                # Slow consumer: only the latest status matters, drop the oldest
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def subscriber_count(self, order_id: Optional[str] = None) -> int:
+        if order_id is not None:
+            return len(self._subscribers.get(order_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
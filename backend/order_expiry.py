@@ -0,0 +1,200 @@
+"""
+Payment window expiry.
+
+Orders still `pending` or `processing` once their payment_window_expires has
+passed are moved to `expired` by a background sweeper, oldest first, one batch
+and one update_many per status at a time. Request handlers can expire a single
+overdue order on the spot with expire().
+
+A `processing` order may have been paid with its callback lost, so with a
+check_payment hook (the reconciler's check_order) Paytm is asked one last
+time first: a final answer settles the order instead, and an order Paytm
+could not be asked about gets an expiry_check_at retry_delay seconds out, so
+a Paytm outage does not keep the sweeper re-reading the same batch. Pending
+orders are swept in their own batch and never wait on Paytm.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING
+
+
+logger = logging.getLogger(__name__)
+
+
+EXPIRABLE_STATUSES = ["pending", "processing"]
+
+
+class OrderExpirySweeper:
+    """Periodically expires orders whose payment window has closed"""
+
+    def __init__(
+        self,
+        db,
+        on_transition: Optional[Callable[[dict, str], Awaitable[None]]] = None,
+        check_payment: Optional[Callable[[dict], Awaitable[Optional[str]]]] = None,
+        interval: float = 60.0,
+        batch_size: int = 500,
+        check_concurrency: int = 5,
+        retry_delay: float = 300.0,
+    ):
+        self.db = db
+        self.on_transition = on_transition
+        self.check_payment = check_payment
+        self.interval = interval
+        self.batch_size = batch_size
+        self.check_concurrency = check_concurrency
+        self.retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    @classmethod
+    def from_env(cls, db, on_transition=None, check_payment=None) -> "OrderExpirySweeper":
+        """Build a sweeper from ORDER_EXPIRY_* environment variables"""
+        return cls(
+            db,
+            on_transition=on_transition,
+            check_payment=check_payment,
+            interval=float(os.environ.get('ORDER_EXPIRY_INTERVAL', 60)),
+            batch_size=int(os.environ.get('ORDER_EXPIRY_BATCH_SIZE', 500)),
+            check_concurrency=int(os.environ.get('ORDER_EXPIRY_CHECK_CONCURRENCY', 5)),
+            retry_delay=float(os.environ.get('ORDER_EXPIRY_RETRY_DELAY', 300)),
+        )
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Order expiry sweeper started (interval=%ss, batch_size=%s)", self.interval, self.batch_size)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        task, self._task = self._task, None
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info("Order expiry sweeper stopped")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                summary = await self.run_once()
+            except Exception as e:
+                logger.exception("Order expiry sweep failed: %s", e)
+                summary = {"scanned": 0}
+
+            # A full batch means more orders are overdue, keep sweeping
+            if summary["scanned"] >= self.batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> dict:
+        """Expire one batch of overdue pending orders and one of overdue processing orders"""
+        now = datetime.now(timezone.utc)
+        summary = {"scanned": 0, "expired": 0, "settled": 0, "deferred": 0}
+
+        pending = await self._overdue({"status": "pending", "payment_window_expires": {"$lte": now}})
+        processing = await self._overdue({
+            "status": "processing",
+            "payment_window_expires": {"$lte": now},
+            "$or": [
+                {"expiry_check_at": {"$exists": False}},
+                {"expiry_check_at": {"$lte": now}}
+            ]
+        })
+        summary["scanned"] = len(pending) + len(processing)
+
+        if processing and self.check_payment:
+            outcomes = await self._final_checks(processing)
+            unreachable = [order_id for order_id, outcome in outcomes.items() if outcome is None]
+            if unreachable:
+                await self.db.orders.update_many(
+                    {"order_id": {"$in": unreachable}, "status": "processing"},
+                    {"$set": {"expiry_check_at": now + timedelta(seconds=self.retry_delay)}}
+                )
+            summary["deferred"] = len(unreachable)
+            summary["settled"] = sum(1 for outcome in outcomes.values() if outcome in ("success", "failed"))
+            processing = [order for order in processing if outcomes[order['order_id']] == 'pending']
+
+        for orders in (pending, processing):
+            if orders:
+                summary["expired"] += await self._expire_batch(orders, now)
+
+        if summary["scanned"]:
+            logger.info(
+                "Expired %s orders past their payment window (%s settled by a last Paytm check, %s deferred)",
+                summary['expired'], summary['settled'], summary['deferred']
+            )
+        return summary
+
+    async def _overdue(self, query: dict) -> List[dict]:
+        return await self.db.orders.find(
+            query, {"_id": 0, "gateway_response": 0}
+        ).sort("payment_window_expires", ASCENDING).limit(self.batch_size).to_list(self.batch_size)
+
+    async def _expire_batch(self, orders: List[dict], now: datetime) -> int:
+        """Expire orders that are still open; returns how many were expired"""
+        order_ids = [order['order_id'] for order in orders]
+        result = await self.db.orders.update_many(
+            {
+                "order_id": {"$in": order_ids},
+                "status": {"$in": EXPIRABLE_STATUSES},
+                "payment_window_expires": {"$lte": now}
+            },
+            {"$set": {"status": "expired", "expired_at": now}, "$unset": {"reconcile_next_at": ""}}
+        )
+
+        if self.on_transition:
+            if result.modified_count < len(orders):
+                # Some orders were paid or settled in between; only report the ones this sweep expired
+                swept = set(await self.db.orders.distinct(
+                    "order_id", {"order_id": {"$in": order_ids}, "expired_at": now}
+                ))
+                orders = [order for order in orders if order['order_id'] in swept]
+            for order in orders:
+                await self.on_transition(order, "expired")
+        return result.modified_count
+
+    async def _final_checks(self, orders: List[dict]) -> Dict[str, Optional[str]]:
+        """check_payment outcome per order_id"""
+        slots = asyncio.Semaphore(self.check_concurrency)
+
+        async def check(order):
+            async with slots:
+                try:
+                    return order['order_id'], await self.check_payment(order)
+                except Exception as e:
+                    logger.error("Final payment check failed for %s: %s", order['order_id'], e)
+                    return order['order_id'], None
+
+        return dict(await asyncio.gather(*[check(order) for order in orders]))
+
+    async def expire(self, order: dict) -> bool:
+        """Expire a single overdue order; returns False if it was settled or expired already"""
+        if self.check_payment and order['status'] == 'processing':
+            outcome = (await self._final_checks([order]))[order['order_id']]
+            if outcome != 'pending':
+                return False
+        now = datetime.now(timezone.utc)
+        result = await self.db.orders.update_one(
+            {
+                "order_id": order['order_id'],
+                "status": {"$in": EXPIRABLE_STATUSES},
+                "payment_window_expires": {"$lte": now}
+            },
+            {"$set": {"status": "expired", "expired_at": now}, "$unset": {"reconcile_next_at": ""}}
+        )
+        if result.modified_count and self.on_transition:
+            await self.on_transition(order, "expired")
+        return bool(result.modified_count)
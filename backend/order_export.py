@@ -0,0 +1,113 @@
+"""
+Streaming order export.
+
+Orders are read from a Motor cursor and encoded as NDJSON or CSV one batch at
+a time, so an export of any size holds at most one batch in memory.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from pymongo import ASCENDING
+
+
+EXPORT_SORT = [("created_at", ASCENDING), ("order_id", ASCENDING)]
+
+EXPORT_FIELDS = [
+    "id",
+    "order_id",
+    "product_id",
+    "product_name",
+    "base_amount",
+    "unique_amount",
+    "status",
+    "payment_method",
+    "payment_gateway_txn_id",
+    "transaction_token",
+    "gateway_response",
+    "user_agent",
+    "ip_address",
+    "payment_window_expires",
+    "created_at",
+    "verified_at",
+]
+
+# Everything except the gateway payload and the short-lived transaction token
+DEFAULT_EXPORT_FIELDS = [f for f in EXPORT_FIELDS if f not in ("gateway_response", "transaction_token")]
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def parse_export_fields(fields: Optional[str]) -> List[str]:
+    """Comma separated field list -> validated list; raises ValueError on unknown fields"""
+    if not fields:
+        return list(DEFAULT_EXPORT_FIELDS)
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+    return selected
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default, separators=(",", ":"))
+    return value
+
+
+async def iter_ndjson(cursor, fields: List[str], batch_size: int) -> AsyncIterator[bytes]:
+    """Yield NDJSON chunks of up to batch_size orders each"""
+    lines = []
+    async for doc in cursor:
+        row = {field: doc.get(field) for field in fields}
+        lines.append(json.dumps(row, default=_json_default, separators=(",", ":")))
+        if len(lines) >= batch_size:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def iter_csv(cursor, fields: List[str], batch_size: int) -> AsyncIterator[bytes]:
+    """Yield a CSV header, then CSV chunks of up to batch_size orders each"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([_csv_value(doc.get(field)) for field in fields])
+        rows += 1
+        if rows >= batch_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def stream_orders(collection, query: dict, fields: List[str], export_format: str, batch_size: int) -> AsyncIterator[bytes]:
+    """Run the export query and stream encoded chunks; the cursor is closed even if the client goes away"""
+    projection = {"_id": 0, **{field: 1 for field in fields}}
+    cursor = collection.find(query, projection).sort(EXPORT_SORT).batch_size(batch_size)
+    encoder = iter_csv if export_format == "csv" else iter_ndjson
+    try:
+        async for chunk in encoder(cursor, fields, batch_size):
+            yield chunk
+    finally:
+        await cursor.close()
@@ -0,0 +1,74 @@
+"""
+Query helpers for order listings.
+
+Admin listings page through orders newest first with a keyset cursor on
+(created_at, order_id), which stays cheap at any depth because each page is
+an index range scan rather than a skip.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from pymongo import DESCENDING
+
+
+ORDER_LIST_SORT = [("created_at", DESCENDING), ("order_id", DESCENDING)]
+
+# Gateway payloads are large and rarely needed in listings
+ORDER_LIST_PROJECTION = {"_id": 0, "gateway_response": 0}
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Treat naive datetimes from query strings as UTC"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def build_order_filter(
+    status: Optional[str] = None,
+    product_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> dict:
+    """Mongo filter for the admin order filters; created_from is inclusive, created_to exclusive"""
+    query = {}
+    if status:
+        query["status"] = status
+    if product_id:
+        query["product_id"] = product_id
+    created_range = {}
+    if created_from is not None:
+        created_range["$gte"] = as_utc(created_from)
+    if created_to is not None:
+        created_range["$lt"] = as_utc(created_to)
+    if created_range:
+        query["created_at"] = created_range
+    return query
+
+
+def encode_cursor(order: dict) -> str:
+    """Opaque cursor pointing just past `order` in ORDER_LIST_SORT order"""
+    payload = {"c": order["created_at"].isoformat(), "o": order["order_id"]}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return as_utc(datetime.fromisoformat(payload["c"])), str(payload["o"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def after_cursor(cursor: str) -> dict:
+    """Filter for orders strictly after the cursor position"""
+    created_at, order_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "order_id": {"$lt": order_id}},
+        ]
+    }
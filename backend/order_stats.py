@@ -0,0 +1,182 @@
+"""
+Incremental order analytics.
+
+One rollup document per (hour, product_id) cohort, where the hour is the hour
+the order was created. Each document counts orders created in the cohort,
+how many currently sit in each status, and the revenue of the successful
+ones. Write paths update the rollups as orders change state, so dashboards
+aggregate O(buckets) documents instead of scanning orders.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+logger = logging.getLogger(__name__)
+
+
+ROLLUP_COLLECTION = "order_stats_hourly"
+ORDER_STATUSES = ("pending", "processing", "success", "failed", "expired")
+
+
+def hour_bucket(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def to_paise(amount: float) -> int:
+    return int(round(amount * 100))
+
+
+def _ratio(numerator: int, denominator: int) -> float:
+    return round(numerator / denominator, 4) if denominator else 0.0
+
+
+class OrderStatsRollup:
+    """Maintains and queries the hourly per-product order rollups"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db[ROLLUP_COLLECTION]
+
+    async def _increment(self, order: dict, inc: dict):
+        bucket = {"hour": hour_bucket(order['created_at']), "product_id": order['product_id']}
+        update = {
+            "$inc": inc,
+            "$setOnInsert": {"product_name": order.get('product_name')}
+        }
+        try:
+            await self.collection.update_one(bucket, update, upsert=True)
+        except DuplicateKeyError:
+            # Two first writes to a new bucket raced on the upsert; the bucket exists now
+            await self.collection.update_one(bucket, update)
+
+    async def record_created(self, order: dict):
+        """Count a newly created order"""
+        await self._increment(order, {"created": 1, order['status']: 1})
+
+    async def record_created_many(self, orders: List[dict]):
+        """Count a batch of newly created orders with one write per touched bucket"""
+        buckets: Dict[Tuple[datetime, str], dict] = {}
+        for order in orders:
+            key = (hour_bucket(order['created_at']), order['product_id'])
+            entry = buckets.setdefault(key, {"inc": {"created": 0}, "product_name": order.get('product_name')})
+            entry["inc"]["created"] += 1
+            entry["inc"][order['status']] = entry["inc"].get(order['status'], 0) + 1
+        if not buckets:
+            return
+
+        updates = [
+            (
+                {"hour": hour, "product_id": product_id},
+                {"$inc": entry["inc"], "$setOnInsert": {"product_name": entry["product_name"]}}
+            )
+            for (hour, product_id), entry in buckets.items()
+        ]
+        try:
+            await self.collection.bulk_write(
+                [UpdateOne(bucket, update, upsert=True) for bucket, update in updates], ordered=False
+            )
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            # Upserts that raced on a new bucket; the bucket exists now
+            await self.collection.bulk_write(
+                [UpdateOne(*updates[error["index"]]) for error in errors], ordered=False
+            )
+
+    async def record_transition(self, order: dict, new_status: str):
+        """Move an order between status counters; `order` is the document before the update"""
+        previous_status = order['status']
+        if previous_status == new_status:
+            return
+        inc = {previous_status: -1, new_status: 1}
+        if new_status == 'success':
+            inc["revenue_paise"] = to_paise(order['unique_amount'])
+        elif previous_status == 'success':
+            inc["revenue_paise"] = -to_paise(order['unique_amount'])
+        await self._increment(order, inc)
+
+    async def summary(
+        self,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        product_id: Optional[str] = None,
+    ) -> dict:
+        """Totals and per-product breakdown for orders created in [created_from, created_to)"""
+        match = {}
+        hour_range = {}
+        if created_from is not None:
+            hour_range["$gte"] = hour_bucket(created_from)
+        if created_to is not None:
+            hour_range["$lt"] = created_to if created_to.tzinfo else created_to.replace(tzinfo=timezone.utc)
+        if hour_range:
+            match["hour"] = hour_range
+        if product_id:
+            match["product_id"] = product_id
+
+        counters = ("created",) + ORDER_STATUSES + ("revenue_paise",)
+        group = {"_id": "$product_id", "product_name": {"$first": "$product_name"}, "buckets": {"$sum": 1}}
+        group.update({counter: {"$sum": f"${counter}"} for counter in counters})
+
+        pipeline = [{"$match": match}, {"$group": group}, {"$sort": {"_id": 1}}]
+        rows = await self.collection.aggregate(pipeline).to_list(None)
+
+        totals = {counter: 0 for counter in counters}
+        products = []
+        for row in rows:
+            for counter in counters:
+                totals[counter] += row.get(counter) or 0
+            products.append(self._present(row, product_id=row["_id"], product_name=row.get("product_name")))
+
+        return {"totals": self._present(totals), "products": products}
+
+    @staticmethod
+    def _present(row: dict, **extra) -> dict:
+        created = row.get("created") or 0
+        success = row.get("success") or 0
+        failed = row.get("failed") or 0
+        result = dict(extra)
+        result.update({status: row.get(status) or 0 for status in ("created",) + ORDER_STATUSES})
+        result.update({
+            "revenue": (row.get("revenue_paise") or 0) / 100,
+            "conversion_rate": _ratio(success, created),
+            "success_ratio": _ratio(success, success + failed),
+            "failure_ratio": _ratio(failed, success + failed),
+        })
+        return result
+
+    async def rebuild(self, batch_size: int = 1000) -> int:
+        """
+        Recompute every rollup from the orders collection
+        Used once to backfill orders created before rollups existed; returns the bucket count
+        """
+        buckets = {}
+        cursor = self.db.orders.find(
+            {}, {"_id": 0, "product_id": 1, "product_name": 1, "created_at": 1, "status": 1, "unique_amount": 1}
+        ).batch_size(batch_size)
+        async for order in cursor:
+            key = (hour_bucket(order['created_at']), order['product_id'])
+            bucket = buckets.setdefault(key, {"product_name": order.get('product_name'), "created": 0, "revenue_paise": 0})
+            bucket["created"] += 1
+            bucket[order['status']] = bucket.get(order['status'], 0) + 1
+            if order['status'] == 'success':
+                bucket["revenue_paise"] += to_paise(order['unique_amount'])
+
+        await self.collection.delete_many({})
+        operations = [
+            UpdateOne({"hour": hour, "product_id": product}, {"$set": values}, upsert=True)
+            for (hour, product), values in buckets.items()
+        ]
+        for start in range(0, len(operations), batch_size):
+            await self.collection.bulk_write(operations[start:start + batch_size], ordered=False)
+        logger.info("Rebuilt %s order stats buckets", len(operations))
+        return len(operations)
@@ -0,0 +1,226 @@
+"""
+Async HTTP client for Paytm server-to-server calls.
+
+All gateway requests share one keep-alive connection pool that is opened on
+app startup and closed on shutdown, so a slow Paytm response only holds its
+own connection instead of blocking the event loop.
+
+Calls go through a circuit breaker: while Paytm is failing or slow they are
+rejected immediately with CircuitOpenError. Each endpoint's read timeout
+adapts to its observed p99 latency, capped at read_timeout.
+"""
+import asyncio
+import os
+import logging
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+import tracing
+from circuit_breaker import AdaptiveTimeout, CircuitBreaker
+from metrics import PAYTM_REJECTED, PAYTM_REQUEST_DURATION
+
+
+logger = logging.getLogger(__name__)
+
+
+class PaytmGatewayError(Exception):
+    """Raised when a Paytm call fails at the transport level or returns invalid JSON"""
+
+
+class CircuitOpenError(PaytmGatewayError):
+    """Raised without calling Paytm while the circuit breaker is open"""
+
+
+class PaytmGatewayClient:
+    """Pooled async client for the Paytm initiateTransaction and order status APIs"""
+
+    def __init__(
+        self,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        max_connections_per_host: int = 20,
+        keepalive_expiry: float = 30.0,
+        breaker: Optional[CircuitBreaker] = None,
+        min_timeout: float = 2.0,
+        timeout_multiplier: float = 3.0,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_expiry = keepalive_expiry
+        self.breaker = breaker or CircuitBreaker(name="Paytm")
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        # Per endpoint (host + path), initiate and status calls have different latencies
+        self._timeouts: Dict[str, AdaptiveTimeout] = {}
+
+    @classmethod
+    def from_env(cls) -> "PaytmGatewayClient":
+        """Build a client from PAYTM_HTTP_* and PAYTM_BREAKER_* environment variables"""
+        breaker = CircuitBreaker(
+            name="Paytm",
+            failure_rate=float(os.environ.get('PAYTM_BREAKER_FAILURE_RATE', 0.5)),
+            slow_call_seconds=float(os.environ.get('PAYTM_BREAKER_SLOW_CALL', 5.0)),
+            slow_call_rate=float(os.environ.get('PAYTM_BREAKER_SLOW_RATE', 0.8)),
+            min_calls=int(os.environ.get('PAYTM_BREAKER_MIN_CALLS', 10)),
+            window_seconds=float(os.environ.get('PAYTM_BREAKER_WINDOW', 60)),
+            open_seconds=float(os.environ.get('PAYTM_BREAKER_OPEN_SECONDS', 30)),
+            half_open_probes=int(os.environ.get('PAYTM_BREAKER_HALF_OPEN_PROBES', 3)),
+        )
+        return cls(
+            connect_timeout=float(os.environ.get('PAYTM_HTTP_CONNECT_TIMEOUT', 5.0)),
+            read_timeout=float(os.environ.get('PAYTM_HTTP_READ_TIMEOUT', 30.0)),
+            max_connections=int(os.environ.get('PAYTM_HTTP_MAX_CONNECTIONS', 50)),
+            max_keepalive_connections=int(os.environ.get('PAYTM_HTTP_MAX_KEEPALIVE', 20)),
+            max_connections_per_host=int(os.environ.get('PAYTM_HTTP_MAX_PER_HOST', 20)),
+            keepalive_expiry=float(os.environ.get('PAYTM_HTTP_KEEPALIVE_EXPIRY', 30.0)),
+            breaker=breaker,
+            min_timeout=float(os.environ.get('PAYTM_HTTP_MIN_TIMEOUT', 2.0)),
+            timeout_multiplier=float(os.environ.get('PAYTM_HTTP_TIMEOUT_P99_MULTIPLIER', 3.0)),
+        )
+
+    @property
+    def started(self) -> bool:
+        return self._client is not None
+
+    @property
+    def circuit_open(self) -> bool:
+        """True while calls are being rejected without reaching Paytm"""
+        return self.breaker.rejecting
+
+    async def start(self):
+        """Open the shared connection pool"""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                connect=self.connect_timeout,
+                read=self.read_timeout,
+                write=self.read_timeout,
+                pool=self.connect_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+        logger.info(
+            "Paytm gateway client started (connect=%ss, read=%ss, max_connections=%s)",
+            self.connect_timeout, self.read_timeout, self.max_connections
+        )
+
+    async def close(self):
+        """Drain and close the shared connection pool"""
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        await client.aclose()
+        logger.info("Paytm gateway client closed")
+
+    def _adaptive_timeout(self, url: str) -> AdaptiveTimeout:
+        parts = urlsplit(url)
+        endpoint = parts.netloc + parts.path
+        timeout = self._timeouts.get(endpoint)
+        if timeout is None:
+            timeout = AdaptiveTimeout(
+                min_timeout=self.min_timeout,
+                max_timeout=self.read_timeout,
+                multiplier=self.timeout_multiplier,
+            )
+            self._timeouts[endpoint] = timeout
+        return timeout
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_slots[host] = slot
+        return slot
+
+    async def post_json(self, url: str, payload: dict) -> dict:
+        """
+        POST a JSON payload and return the decoded JSON response
+        Raises PaytmGatewayError on transport errors or a non-JSON body,
+        CircuitOpenError without sending anything while the breaker is open
+        """
+        if self._client is None:
+            # Lazily open the pool for callers outside the app lifecycle (scripts, tests)
+            await self.start()
+
+        endpoint = urlsplit(url).path
+        with tracing.span("paytm.request", kind="client", endpoint=endpoint) as span:
+            return await self._post_json(url, payload, endpoint, span)
+
+    async def _post_json(self, url: str, payload: dict, endpoint: str, span) -> dict:
+        if not self.breaker.allow():
+            PAYTM_REJECTED.inc(endpoint)
+            raise CircuitOpenError("Paytm circuit breaker is open")
+
+        adaptive = self._adaptive_timeout(url)
+        span.set_attribute("timeout_s", adaptive.timeout())
+        timeout = httpx.Timeout(
+            connect=self.connect_timeout,
+            read=adaptive.timeout(),
+            write=self.read_timeout,
+            pool=self.connect_timeout,
+        )
+        started = time.monotonic()
+        try:
+            async with self._host_slot(url):
+                # Time the call itself, not the wait for a connection slot
+                started = time.monotonic()
+                try:
+                    response = await self._client.post(url, json=payload, timeout=timeout)
+                except httpx.TimeoutException as e:
+                    PAYTM_REQUEST_DURATION.observe(time.monotonic() - started, endpoint, "timeout")
+                    raise PaytmGatewayError(f"{type(e).__name__}: {e}") from e
+                except httpx.HTTPError as e:
+                    PAYTM_REQUEST_DURATION.observe(time.monotonic() - started, endpoint, "transport_error")
+                    raise PaytmGatewayError(f"{type(e).__name__}: {e}") from e
+
+            try:
+                data = response.json()
+            except ValueError as e:
+                PAYTM_REQUEST_DURATION.observe(time.monotonic() - started, endpoint, "invalid_response")
+                raise PaytmGatewayError(
+                    f"Invalid JSON from Paytm (HTTP {response.status_code})"
+                ) from e
+        except asyncio.CancelledError:
+            # The caller went away; that says nothing about Paytm's health
+            self.breaker.cancel()
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+
+        latency = time.monotonic() - started
+        ok = response.status_code < 500
+        span.set_attribute("http.status_code", response.status_code)
+        PAYTM_REQUEST_DURATION.observe(latency, endpoint, "ok" if ok else "server_error")
+        self.breaker.record(ok, latency)
+        if ok:
+            adaptive.observe(latency)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "timeouts": {endpoint: timeout.stats() for endpoint, timeout in self._timeouts.items()},
+        }
+
+
+def extract_result_status(response_data: dict) -> Optional[str]:
+    """Pull body.resultInfo.resultStatus (TXN_SUCCESS, TXN_FAILURE, PENDING) out of a status response"""
+    return response_data.get("body", {}).get("resultInfo", {}).get("resultStatus")
@@ -0,0 +1,233 @@
+"""
+Background reconciliation of in-flight payments.
+
+Orders stuck in `processing` (for example because the Paytm callback never
+arrived) are checked against the Paytm order status API in batches. Every
+worker runs a reconciler, so a batch is claimed first: its reconcile_next_at
+is pushed out by a lease and tagged with a claim token, and only orders this
+claim won are checked. Each order backs off exponentially between checks; the backoff bookkeeping for a
+batch is written with a single bulk_write, while the (rarer) settlements are
+applied as guarded find_one_and_update calls so each transition is observed
+exactly once.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+
+from paytm_client import extract_result_status
+
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentReconciler:
+    """Periodically settles processing orders against the Paytm status API"""
+
+    def __init__(
+        self,
+        db,
+        fetch_status: Callable[[str], Awaitable[dict]],
+        on_transition: Optional[Callable[[dict, str], Awaitable[None]]] = None,
+        interval: float = 30.0,
+        batch_size: int = 100,
+        concurrency: int = 5,
+        base_backoff: float = 15.0,
+        max_backoff: float = 900.0,
+        lease_seconds: float = 120.0,
+    ):
+        self.db = db
+        self.fetch_status = fetch_status
+        self.on_transition = on_transition
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    @classmethod
+    def from_env(cls, db, fetch_status, on_transition=None) -> "PaymentReconciler":
+        """Build a reconciler from RECONCILER_* environment variables"""
+        return cls(
+            db,
+            fetch_status,
+            on_transition=on_transition,
+            interval=float(os.environ.get('RECONCILER_INTERVAL', 30)),
+            batch_size=int(os.environ.get('RECONCILER_BATCH_SIZE', 100)),
+            concurrency=int(os.environ.get('RECONCILER_CONCURRENCY', 5)),
+            base_backoff=float(os.environ.get('RECONCILER_BASE_BACKOFF', 15)),
+            max_backoff=float(os.environ.get('RECONCILER_MAX_BACKOFF', 900)),
+            lease_seconds=float(os.environ.get('RECONCILER_LEASE_SECONDS', 120)),
+        )
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next check of an order that has been checked `attempts` times"""
+        delay = min(self.base_backoff * (2 ** max(attempts - 1, 0)), self.max_backoff)
+        # Jitter spreads out orders that were initiated together
+        return delay * random.uniform(0.8, 1.2)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "Payment reconciler started (interval=%ss, batch_size=%s, concurrency=%s)",
+            self.interval, self.batch_size, self.concurrency
+        )
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        task, self._task = self._task, None
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info("Payment reconciler stopped")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                summary = await self.run_once()
+            except Exception as e:
+                logger.exception("Payment reconciliation pass failed: %s", e)
+                summary = {"scanned": 0}
+
+            # A full batch means more orders are due, keep draining
+            if summary["scanned"] >= self.batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> Tuple[str, List[dict]]:
+        """Claim up to batch_size due processing orders for this worker"""
+        now = datetime.now(timezone.utc)
+        due = {
+            "status": "processing",
+            "$or": [
+                {"reconcile_next_at": {"$exists": False}},
+                {"reconcile_next_at": {"$lte": now}}
+            ]
+        }
+        candidates = await self.db.orders.find(due, {"_id": 1}).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return "", []
+
+        claim = uuid.uuid4().hex
+        # Until the lease runs out no other worker sees these orders as due, even if this one dies
+        await self.db.orders.update_many(
+            {"$and": [due, {"_id": {"$in": [c["_id"] for c in candidates]}}]},
+            {"$set": {"reconcile_claim": claim, "reconcile_next_at": now + timedelta(seconds=self.lease_seconds)}}
+        )
+        # Other workers may have won some candidates; only keep what this claim got
+        orders = await self.db.orders.find(
+            {"reconcile_claim": claim, "status": "processing"},
+            {"_id": 0, "gateway_response": 0}
+        ).to_list(self.batch_size)
+        return claim, orders
+
+    async def run_once(self) -> dict:
+        """Reconcile one batch of due processing orders"""
+        claim, orders = await self._claim()
+
+        summary = {"scanned": len(orders), "success": 0, "failed": 0, "pending": 0}
+        if not orders:
+            return summary
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def check(order):
+            async with slots:
+                return order, await self.fetch_status(order['order_id'])
+
+        results = await asyncio.gather(*[check(order) for order in orders])
+
+        operations = []
+        settlements = []
+        checked_at = datetime.now(timezone.utc)
+        for order, paytm_response in results:
+            settlement = self._settlement(order, paytm_response, checked_at)
+            if settlement is not None:
+                settlements.append(settlement)
+            else:
+                attempts = order.get('reconcile_attempts', 0) + 1
+                guard = {"order_id": order['order_id'], "status": "processing", "reconcile_claim": claim}
+                operations.append(UpdateOne(guard, {
+                    "$set": {
+                        "reconcile_attempts": attempts,
+                        "reconcile_next_at": checked_at + timedelta(seconds=self.backoff(attempts))
+                    }
+                }))
+                summary["pending"] += 1
+
+        if operations:
+            await self.db.orders.bulk_write(operations, ordered=False)
+
+        for status in await asyncio.gather(*settlements):
+            if status:
+                summary[status] += 1
+
+        logger.info(
+            "Reconciled %s orders: %s success, %s failed, %s still pending",
+            summary['scanned'], summary['success'], summary['failed'], summary['pending']
+        )
+        return summary
+
+    async def check_order(self, order: dict) -> Optional[str]:
+        """
+        Ask Paytm about one processing order and settle it if Paytm has a final answer
+        Returns the status applied, "pending" if Paytm has none yet, or None if Paytm
+        could not be asked or the order stopped being processing in the meantime
+        """
+        paytm_response = await self.fetch_status(order['order_id'])
+        if not paytm_response["success"]:
+            return None
+        settlement = self._settlement(order, paytm_response, datetime.now(timezone.utc))
+        if settlement is None:
+            return "pending"
+        return await settlement
+
+    def _settlement(self, order: dict, paytm_response: dict, checked_at: datetime) -> Optional[Awaitable[Optional[str]]]:
+        """The settlement for a final Paytm answer, None while there is none"""
+        if not paytm_response["success"]:
+            return None
+        result_status = extract_result_status(paytm_response["data"])
+
+        # Only settle orders that are still processing, a callback may have won the race
+        guard = {"order_id": order['order_id'], "status": "processing"}
+
+        if result_status == "TXN_SUCCESS":
+            return self._settle(guard, "success", {
+                "verified_at": checked_at,
+                "gateway_response": paytm_response["data"]
+            })
+        if result_status == "TXN_FAILURE":
+            return self._settle(guard, "failed", {"gateway_response": paytm_response["data"]})
+        return None
+
+    async def _settle(self, guard: dict, status: str, fields: dict) -> Optional[str]:
+        """Apply a final status if the order still matches guard; returns the status when applied"""
+        previous = await self.db.orders.find_one_and_update(
+            guard,
+            {"$set": {"status": status, **fields}, "$unset": {"reconcile_next_at": ""}},
+            projection={"_id": 0, "gateway_response": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous is None:
+            return None
+        if self.on_transition:
+            await self.on_transition(previous, status)
+        return status
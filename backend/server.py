@@ -1,38 +1,76 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Query
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import Any, List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
-import random
 import json
-import requests
-try:
-    import PaytmChecksum
-except ImportError:
-    from paytmchecksum import PaytmChecksum
+from paytm_client import CircuitOpenError, PaytmGatewayClient, PaytmGatewayError, extract_result_status
+from singleflight import SingleFlight
+from cache_backend import VersionedCache, cache_backend_from_env
+from order_cache import OrderCache
+from reconciler import PaymentReconciler
+from order_expiry import OrderExpirySweeper
+from callback_queue import CallbackQueue
+from checksum_pool import ChecksumExecutor
+from order_events import OrderEventBroker, format_sse
+from indexes import ensure_indexes
+import metrics
+import tracing
+from log_pipeline import LogPipeline
+from fast_json import FastJSONResponse, TrustedDocumentEncoder, portable
+from order_queries import (
+    ORDER_LIST_PROJECTION,
+    ORDER_LIST_SORT,
+    after_cursor,
+    build_order_filter,
+    encode_cursor
+)
+from order_export import EXPORT_FORMATS, parse_export_fields, stream_orders
+from order_stats import OrderStatsRollup
+from amount_allocator import (
+    AmountAllocationError,
+    UniqueAmountAllocator,
+    amount_offset,
+    generate_unique_amount
+)
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging: records are formatted and written off the event loop
+log_pipeline = LogPipeline.from_env()
+log_pipeline.start()
 logger = logging.getLogger(__name__)
 
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+# Request tracing is off unless TRACE_EXPORTER names a file or collector
+tracer = tracing.Tracer.from_env()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Datetimes are stored as native BSON dates and read back as aware UTC datetimes
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    event_listeners=(
+        ([metrics.MongoCommandMetrics()] if METRICS_ENABLED else [])
+        + ([tracing.MongoTraceListener()] if tracer.enabled else [])
+    )
+)
 db = client[os.environ['DB_NAME']]
+MONGO_ENSURE_INDEXES = os.environ.get('MONGO_ENSURE_INDEXES', 'true').lower() == 'true'
 
 # Paytm Configuration
 PAYTM_ENVIRONMENT = os.environ.get('PAYTM_ENVIRONMENT', 'STAGING')
@@ -50,6 +88,56 @@ if PAYTM_ENVIRONMENT == 'STAGING':
 else:
     PAYTM_TXN_URL = "https://securegw.paytm.in/theia/api/v1/initiateTransaction"
     PAYTM_STATUS_URL = "https://securegw.paytm.in/order/status"
+# Point the gateway calls somewhere else, e.g. the load test's Paytm stand-in
+PAYTM_TXN_URL = os.environ.get('PAYTM_TXN_URL', PAYTM_TXN_URL)
+PAYTM_STATUS_URL = os.environ.get('PAYTM_STATUS_URL', PAYTM_STATUS_URL)
+
+# Shared async HTTP client for Paytm server-to-server calls, behind a circuit breaker
+paytm_client = PaytmGatewayClient.from_env()
+PAYTM_UNAVAILABLE_MESSAGE = "Payment gateway temporarily unavailable"
+
+# Runs checksum signing/verification in a worker pool instead of on the event loop
+checksum_executor = ChecksumExecutor.from_env(PAYTM_KEY)
+
+# Coalesces concurrent /payment/status lookups for the same order
+payment_status_flight = SingleFlight()
+
+# Storage for caches that should be shared by all workers (CACHE_BACKEND=memory keeps them per worker)
+cache_backend = cache_backend_from_env()
+
+# Orders in these states are not checked with Paytm or watched for events any more
+TERMINAL_ORDER_STATUSES = ('success', 'failed', 'expired')
+
+# Payment status cache: success is kept until evicted, other states expire after the TTL
+# (a late success callback may still settle a failed or expired order)
+FINAL_ORDER_STATUSES = ('success',)
+PAYMENT_STATUS_CACHE_TTL = float(os.environ.get('PAYMENT_STATUS_CACHE_TTL', 5))
+payment_status_cache = VersionedCache(cache_backend, "payment_status", ttl=PAYMENT_STATUS_CACHE_TTL)
+
+# Changed on every order update, so a status lookup that raced one does not cache what it read before it
+order_generations = VersionedCache(cache_backend, "order_generation", ttl=60)
+
+# Read-through cache for get_order; short-lived per worker unless entries are shared or watched
+order_cache = OrderCache.from_env(db, backend=cache_backend)
+
+# Pushes order status transitions to /orders/{order_id}/events subscribers
+order_events = OrderEventBroker()
+ORDER_EVENTS_HEARTBEAT = float(os.environ.get('ORDER_EVENTS_HEARTBEAT', 15))
+ORDER_EVENTS_MAX_DURATION = float(os.environ.get('ORDER_EVENTS_MAX_DURATION', 1800))
+
+# "inline" applies callbacks in the request, "queue" hands them to the callback queue workers
+PAYTM_CALLBACK_MODE = os.environ.get('PAYTM_CALLBACK_MODE', 'inline').lower()
+CALLBACK_QUEUE_DEFER_VERIFY = os.environ.get('CALLBACK_QUEUE_DEFER_VERIFY', 'false').lower() == 'true'
+
+# Remembers applied callbacks by (ORDERID, TXNID, STATUS) so Paytm retries skip the database
+callback_dedup_cache = VersionedCache(
+    cache_backend,
+    "callback_dedup",
+    ttl=float(os.environ.get('CALLBACK_DEDUP_TTL', 600))
+)
+
+# Render order reads straight from the stored document instead of re-validating it through Order
+FAST_ORDER_RESPONSES = os.environ.get('FAST_ORDER_RESPONSES', 'false').lower() == 'true'
 
 # Get backend URL from environment
 BACKEND_URL = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')
@@ -101,6 +189,23 @@ class Order(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     verified_at: Optional[datetime] = None
 
+order_encoder = TrustedDocumentEncoder(Order)
+
+# Bulk order models; items are validated one by one so a bad item does not reject the batch
+class BulkOrderCreate(BaseModel):
+    orders: List[Any]
+
+class BulkOrderItemResult(BaseModel):
+    index: int
+    success: bool
+    order: Optional[Order] = None
+    error: Optional[str] = None
+
+class BulkOrderResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkOrderItemResult]
+
 # Payment Gateway Models
 class PaymentInitiateRequest(BaseModel):
     order_id: str
@@ -123,14 +228,20 @@ class PaymentStatusResponse(BaseModel):
     amount: float
     message: str
 
+payment_status_encoder = TrustedDocumentEncoder(PaymentStatusResponse)
+
 
 # ==================== PAYTM HELPER FUNCTIONS ====================
 
-def generate_transaction_token(order_id: str, amount: float, customer_id: str, customer_mobile: str) -> dict:
+async def generate_transaction_token(order_id: str, amount: float, customer_id: str, customer_mobile: str) -> dict:
     """
     Generate Paytm transaction token for payment initiation
     Returns: dict with success status and token or error message
+    ("unavailable" is set when the circuit breaker stopped the call)
     """
+    if paytm_client.circuit_open:
+        return {"success": False, "error": PAYTM_UNAVAILABLE_MESSAGE, "unavailable": True}
+    
     try:
         # Generate unique transaction ID
         txn_id = f"TXN{int(datetime.now().timestamp() * 1000)}"
@@ -158,26 +269,18 @@ def generate_transaction_token(order_id: str, amount: float, customer_id: str, c
         }
         
         # Generate checksum
-        checksum = PaytmChecksum.generateSignature(
-            json.dumps(paytm_params["body"]), 
-            PAYTM_KEY
-        )
+        checksum = await checksum_executor.sign(json.dumps(paytm_params["body"]))
         paytm_params["head"]["signature"] = checksum
         
         # Make API call to Paytm
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         url = f"{PAYTM_TXN_URL}?mid={PAYTM_MID}&orderId={order_id}"
         
-        logger.info(f"Initiating Paytm transaction for order {order_id}")
-        logger.info(f"Paytm URL: {url}")
+        logger.info("Initiating Paytm transaction for order %s", order_id)
+        logger.info("Paytm URL: %s", url)
         
-        response = requests.post(url, json=paytm_params, headers=headers, timeout=30)
-        response_data = response.json()
+        response_data = await paytm_client.post_json(url, paytm_params)
         
-        logger.info(f"Paytm token response: {response_data}")
+        logger.info("Paytm token response: %s", response_data)
         
         if response_data.get("body", {}).get("resultInfo", {}).get("resultStatus") == "S":
             # Success - extract token
@@ -191,34 +294,41 @@ def generate_transaction_token(order_id: str, amount: float, customer_id: str, c
         else:
             # Failed
             error_msg = response_data.get("body", {}).get("resultInfo", {}).get("resultMsg", "Token generation failed")
-            logger.error(f"Paytm token error: {error_msg}")
+            logger.error("Paytm token error: %s", error_msg)
             return {
                 "success": False,
                 "error": error_msg
             }
             
+    except CircuitOpenError:
+        return {"success": False, "error": PAYTM_UNAVAILABLE_MESSAGE, "unavailable": True}
+    except PaytmGatewayError as e:
+        logger.error("Paytm gateway error generating transaction token: %s", e)
+        return {
+            "success": False,
+            "error": str(e)
+        }
     except Exception as e:
-        logger.exception(f"Error generating transaction token: {e}")
+        logger.exception("Error generating transaction token: %s", e)
         return {
             "success": False,
             "error": str(e)
         }
 
 
-def verify_paytm_checksum(paytm_params: dict, checksum: str) -> bool:
+async def verify_paytm_checksum(paytm_params: dict, checksum: str) -> bool:
     """Verify Paytm callback checksum"""
-    try:
-        return PaytmChecksum.verifySignature(paytm_params, PAYTM_KEY, checksum)
-    except Exception as e:
-        logger.error(f"Checksum verification error: {str(e)}")
-        return False
+    return await checksum_executor.verify(paytm_params, checksum)
 
 
-def get_payment_status_from_paytm(order_id: str) -> dict:
+async def get_payment_status_from_paytm(order_id: str) -> dict:
     """
     Get payment status from Paytm
     Returns: dict with payment status information
     """
+    if paytm_client.circuit_open:
+        return {"success": False, "error": PAYTM_UNAVAILABLE_MESSAGE, "unavailable": True}
+    
     try:
         # Prepare request parameters
         paytm_params = {
@@ -232,35 +342,72 @@ def get_payment_status_from_paytm(order_id: str) -> dict:
         }
         
         # Generate checksum
-        checksum = PaytmChecksum.generateSignature(
-            json.dumps(paytm_params["body"]), 
-            PAYTM_KEY
-        )
+        checksum = await checksum_executor.sign(json.dumps(paytm_params["body"]))
         paytm_params["head"]["signature"] = checksum
         
         # Make API call
-        headers = {
-            "Content-Type": "application/json"
-        }
+        response_data = await paytm_client.post_json(PAYTM_STATUS_URL, paytm_params)
         
-        response = requests.post(PAYTM_STATUS_URL, json=paytm_params, headers=headers, timeout=30)
-        response_data = response.json()
-        
-        logger.info(f"Paytm status response: {response_data}")
+        logger.info("Paytm status response: %s", response_data)
         
         return {
             "success": True,
             "data": response_data
         }
         
+    except CircuitOpenError:
+        return {"success": False, "error": PAYTM_UNAVAILABLE_MESSAGE, "unavailable": True}
+    except PaytmGatewayError as e:
+        logger.error("Paytm gateway error checking payment status: %s", e)
+        return {
+            "success": False,
+            "error": str(e)
+        }
     except Exception as e:
-        logger.exception(f"Error checking payment status: {e}")
+        logger.exception("Error checking payment status: %s", e)
         return {
             "success": False,
             "error": str(e)
         }
 
 
+# Hourly per-product rollups behind /admin/stats
+order_stats = OrderStatsRollup(db)
+
+# Leases paise offsets so concurrent orders for the same price get distinct amounts
+PAYMENT_WINDOW_MINUTES = 30
+amount_allocator = UniqueAmountAllocator(db)
+
+
+async def notify_order_update(order: dict, status: str):
+    """
+    Propagate an order status change to caches, streaming clients and analytics
+    `order` is the document as it was before the update
+    """
+    order_id = order['order_id']
+    await order_generations.set(order_id, uuid.uuid4().hex)
+    await payment_status_cache.delete(order_id)
+    await order_cache.invalidate(order_id)
+    order_events.publish(order_id, {"order_id": order_id, "status": status})
+    
+    try:
+        await order_stats.record_transition(order, status)
+    except Exception as e:
+        logger.error("Failed to update order stats for %s: %s", order_id, e)
+    
+    # A paid order's amount can be handed out again right away. Failed and expired orders keep
+    # theirs until the lease runs out with the payment window: a late success may still settle them
+    if status == 'success' and order['status'] != status:
+        try:
+            await amount_allocator.release(
+                order['base_amount'],
+                amount_offset(order['base_amount'], order['unique_amount']),
+                order['id']
+            )
+        except Exception as e:
+            logger.error("Failed to release amount lease for %s: %s", order_id, e)
+
+
 # ==================== BASIC ROUTES ====================
 
 @router.get("/")
@@ -273,7 +420,6 @@ async def create_status_check(input: StatusCheckCreate):
     status_obj = StatusCheck(**status_dict)
     
     doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
     
     _ = await db.status_checks.insert_one(doc)
     return status_obj
@@ -281,21 +427,12 @@ async def create_status_check(input: StatusCheckCreate):
 @router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
     status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-    
     return status_checks
 
 
 # ==================== ORDER ENDPOINTS ====================
 
-def generate_unique_amount(base_amount: float) -> float:
-    """Generate a unique payment amount by adding random paise"""
-    random_paise = random.randint(1, 99) / 100.0
-    unique_amount = base_amount + random_paise
-    return round(unique_amount, 2)
+ORDER_ID_ATTEMPTS = 3
 
 @router.post("/orders", response_model=Order)
 async def create_order(order_input: OrderCreate, request: Request):
@@ -304,14 +441,18 @@ async def create_order(order_input: OrderCreate, request: Request):
         order_dict = order_input.model_dump()
         
         base_amount = order_dict['amount']
-        unique_amount = generate_unique_amount(base_amount)
+        payment_window_expires = datetime.now(timezone.utc) + timedelta(minutes=PAYMENT_WINDOW_MINUTES)
         
-        payment_window_expires = datetime.now(timezone.utc) + timedelta(minutes=30)
+        # Lease a paise offset for the payment window, keyed by the order's internal id
+        order_ref = str(uuid.uuid4())
+        paise_offset = await amount_allocator.allocate(base_amount, order_ref, payment_window_expires)
+        unique_amount = generate_unique_amount(base_amount, paise_offset)
         
         user_agent = order_dict.get('user_agent') or request.headers.get('user-agent', 'Unknown')
         ip_address = order_dict.get('ip_address') or request.client.host
         
         order_obj = Order(
+            id=order_ref,
             product_id=order_dict['product_id'],
             product_name=order_dict['product_name'],
             base_amount=base_amount,
@@ -322,36 +463,223 @@ async def create_order(order_input: OrderCreate, request: Request):
         )
         
         doc = order_obj.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        doc['payment_window_expires'] = doc['payment_window_expires'].isoformat()
         
-        await db.orders.insert_one(doc)
+        # order_id is uniquely indexed; regenerate it on the rare random collision
+        try:
+            for attempt in range(ORDER_ID_ATTEMPTS):
+                try:
+                    await db.orders.insert_one(doc)
+                    break
+                except DuplicateKeyError:
+                    if attempt == ORDER_ID_ATTEMPTS - 1:
+                        raise
+                    logger.warning("Order id collision on %s, regenerating", order_obj.order_id)
+                    order_obj.order_id = Order.model_fields['order_id'].default_factory()
+                    doc['order_id'] = order_obj.order_id
+        except Exception:
+            await amount_allocator.release(base_amount, paise_offset, order_ref)
+            raise
         
-        logger.info(f"Order created: {order_obj.order_id} - Amount: ₹{unique_amount}")
+        try:
+            await order_stats.record_created(doc)
+        except Exception as e:
+            logger.error("Failed to update order stats for %s: %s", order_obj.order_id, e)
+        
+        logger.info("Order created: %s - Amount: ₹%s", order_obj.order_id, unique_amount)
         return order_obj
         
+    except AmountAllocationError as e:
+        logger.warning("Amount allocation failed: %s", e)
+        raise HTTPException(status_code=503, detail="All payment amounts for this price are in use, please retry shortly")
     except Exception as e:
-        logger.error(f"Error creating order: {str(e)}")
+        logger.error("Error creating order: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
+BULK_ORDER_MAX_ITEMS = int(os.environ.get('BULK_ORDER_MAX_ITEMS', 500))
+
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'item'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+async def insert_orders(orders: List[Order]) -> dict:
+    """
+    Insert orders with unordered insert_many, regenerating order_ids that collide
+    Returns: {position: error message} for the orders that could not be inserted
+    """
+    failed = {}
+    pending = list(range(len(orders)))
+    
+    for attempt in range(ORDER_ID_ATTEMPTS):
+        if not pending:
+            break
+        try:
+            await db.orders.insert_many([orders[i].model_dump() for i in pending], ordered=False)
+            pending = []
+        except BulkWriteError as e:
+            retry = []
+            for error in e.details.get("writeErrors", []):
+                position = pending[error["index"]]
+                if error.get("code") == 11000 and attempt < ORDER_ID_ATTEMPTS - 1:
+                    logger.warning("Order id collision on %s, regenerating", orders[position].order_id)
+                    orders[position].order_id = Order.model_fields['order_id'].default_factory()
+                    retry.append(position)
+                else:
+                    failed[position] = error.get("errmsg", "Insert failed")
+            pending = retry
+    
+    return failed
+
+
+@router.post("/orders/bulk", response_model=BulkOrderResponse)
+async def create_orders_bulk(bulk_input: BulkOrderCreate, request: Request):
+    """
+    Create many orders in one request
+    Each item is validated separately; results are returned per item, in request order
+    """
+    if not bulk_input.orders:
+        raise HTTPException(status_code=400, detail="No orders given")
+    if len(bulk_input.orders) > BULK_ORDER_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_ORDER_MAX_ITEMS} orders per request")
+    
+    results = [BulkOrderItemResult(index=i, success=False) for i in range(len(bulk_input.orders))]
+    
+    # 1. Validate every item
+    valid = []
+    for index, item in enumerate(bulk_input.orders):
+        try:
+            valid.append((index, OrderCreate.model_validate(item)))
+        except ValidationError as e:
+            results[index].error = validation_message(e)
+    
+    # 2. Lease unique amounts for the whole batch
+    payment_window_expires = datetime.now(timezone.utc) + timedelta(minutes=PAYMENT_WINDOW_MINUTES)
+    order_refs = [str(uuid.uuid4()) for _ in valid]
+    try:
+        offsets = await amount_allocator.allocate_many(
+            [(order_input.amount, order_ref) for (_, order_input), order_ref in zip(valid, order_refs)],
+            payment_window_expires
+        )
+    except Exception as e:
+        logger.error("Error allocating amounts for bulk orders: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to create orders: {str(e)}")
+    
+    default_user_agent = request.headers.get('user-agent', 'Unknown')
+    default_ip_address = request.client.host
+    orders = []
+    for (index, order_input), order_ref, offset in zip(valid, order_refs, offsets):
+        if offset is None:
+            results[index].error = "All payment amounts for this price are in use, please retry shortly"
+            continue
+        orders.append((index, offset, Order(
+            id=order_ref,
+            product_id=order_input.product_id,
+            product_name=order_input.product_name,
+            base_amount=order_input.amount,
+            unique_amount=generate_unique_amount(order_input.amount, offset),
+            user_agent=order_input.user_agent or default_user_agent,
+            ip_address=order_input.ip_address or default_ip_address,
+            payment_window_expires=payment_window_expires
+        )))
+    
+    # 3. Write them all at once
+    try:
+        failed = await insert_orders([order for _, _, order in orders]) if orders else {}
+    except Exception as e:
+        failed = {position: str(e) for position in range(len(orders))}
+    
+    created = []
+    for position, (index, offset, order) in enumerate(orders):
+        if position in failed:
+            results[index].error = f"Failed to create order: {failed[position]}"
+            try:
+                await amount_allocator.release(order.base_amount, offset, order.id)
+            except Exception as e:
+                logger.error("Failed to release amount lease for %s: %s", order.order_id, e)
+        else:
+            results[index].success = True
+            results[index].order = order
+            created.append(order.model_dump())
+    
+    try:
+        await order_stats.record_created_many(created)
+    except Exception as e:
+        logger.error("Failed to update order stats for %s bulk orders: %s", len(created), e)
+    
+    logger.info("Bulk order request: %s created, %s failed", len(created), len(results) - len(created))
+    return BulkOrderResponse(
+        created=len(created),
+        failed=len(results) - len(created),
+        results=results
+    )
+
 @router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str):
     """Get order details by order_id"""
-    order = await db.orders.find_one({"order_id": order_id}, {"_id": 0})
+    order = await order_cache.get(order_id)
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    if isinstance(order.get('created_at'), str):
-        order['created_at'] = datetime.fromisoformat(order['created_at'])
-    if isinstance(order.get('payment_window_expires'), str):
-        order['payment_window_expires'] = datetime.fromisoformat(order['payment_window_expires'])
-    if order.get('verified_at') and isinstance(order['verified_at'], str):
-        order['verified_at'] = datetime.fromisoformat(order['verified_at'])
+    if FAST_ORDER_RESPONSES:
+        response = order_encoder.response(order)
+        if response is not None:
+            return response
     
     return order
 
 
+@router.get("/orders/{order_id}/events")
+async def stream_order_events(order_id: str, request: Request):
+    """
+    Stream order status changes as Server-Sent Events
+    Sends the current status first, then each transition until the order is settled
+    """
+    # Subscribe before reading so a transition between the read and the stream is not lost
+    queue = order_events.subscribe(order_id)
+    order = await db.orders.find_one({"order_id": order_id}, {"_id": 0, "status": 1})
+    
+    if not order:
+        order_events.unsubscribe(order_id, queue)
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ORDER_EVENTS_MAX_DURATION
+        status = order['status']
+        try:
+            yield format_sse("status", {"order_id": order_id, "status": status})
+            
+            while status not in TERMINAL_ORDER_STATUSES and loop.time() < deadline:
+                if await request.is_disconnected():
+                    break
+                
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=ORDER_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # The update may have been handled by another worker, check the database
+                    current = await db.orders.find_one({"order_id": order_id}, {"_id": 0, "status": 1})
+                    if not current or current['status'] == status:
+                        yield ": keep-alive\n\n"
+                        continue
+                    event = {"order_id": order_id, "status": current['status']}
+                
+                if event['status'] != status:
+                    status = event['status']
+                    yield format_sse("status", event)
+        finally:
+            order_events.unsubscribe(order_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ==================== PAYTM PAYMENT GATEWAY ENDPOINTS ====================
 
 @router.post("/payment/initiate", response_model=PaymentInitiateResponse)
@@ -370,35 +698,55 @@ async def initiate_payment(payment_request: PaymentInitiateRequest, request: Req
         if order['status'] not in ['pending', 'processing']:
             raise HTTPException(status_code=400, detail=f"Order already {order['status']}")
         
+        # Past the payment window: expire it here instead of asking Paytm for a token
+        if order['payment_window_expires'] <= datetime.now(timezone.utc):
+            if await order_expiry.expire(order):
+                raise HTTPException(status_code=400, detail="Order already expired")
+            # The last Paytm check may have settled it instead, or Paytm could not be asked
+            current = await db.orders.find_one({"order_id": payment_request.order_id}, {"_id": 0, "status": 1})
+            if current and current['status'] not in ['pending', 'processing']:
+                raise HTTPException(status_code=400, detail=f"Order already {current['status']}")
+            raise HTTPException(status_code=400, detail="Payment window has closed")
+        
         # 2. Generate transaction token from Paytm
-        token_response = generate_transaction_token(
+        token_response = await generate_transaction_token(
             order_id=payment_request.order_id,
             amount=order['unique_amount'],
             customer_id=payment_request.customer_id,
             customer_mobile=payment_request.customer_mobile
         )
         
+        if token_response.get("unavailable"):
+            raise HTTPException(status_code=503, detail=PAYTM_UNAVAILABLE_MESSAGE)
+        
         if not token_response["success"]:
             error_msg = token_response.get("error", "Failed to generate transaction token")
-            logger.error(f"Paytm token error: {error_msg}")
+            logger.error("Paytm token error: %s", error_msg)
             raise HTTPException(status_code=400, detail=error_msg)
         
         # 3. Update order with transaction details
         txn_id = token_response["txn_id"]
         token = token_response["token"]
         
-        await db.orders.update_one(
-            {"order_id": payment_request.order_id},
+        # Guarded: a callback may have settled the order while the token was being generated
+        previous = await db.orders.find_one_and_update(
+            {"order_id": payment_request.order_id, "status": {"$in": ['pending', 'processing']}},
             {
                 "$set": {
                     "payment_gateway_txn_id": txn_id,
                     "transaction_token": token,
                     "status": "processing"
                 }
-            }
+            },
+            projection={"_id": 0, "gateway_response": 0},
+            return_document=ReturnDocument.BEFORE
         )
+        if previous is None:
+            current = await db.orders.find_one({"order_id": payment_request.order_id}, {"_id": 0, "status": 1})
+            raise HTTPException(status_code=400, detail=f"Order already {current['status'] if current else 'gone'}")
+        await notify_order_update(previous, "processing")
         
-        logger.info(f"Payment initiated: Order {payment_request.order_id}, Token generated")
+        logger.info("Payment initiated: Order %s, Token generated", payment_request.order_id)
         
         return PaymentInitiateResponse(
             success=True,
@@ -411,10 +759,70 @@ async def initiate_payment(payment_request: PaymentInitiateRequest, request: Req
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error initiating payment: {str(e)}")
+        logger.error("Error initiating payment: %s", e)
         raise HTTPException(status_code=500, detail=f"Payment initiation failed: {str(e)}")
 
 
+# A success may settle any order that is not already successful (including one that
+# expired while the customer was paying); a failure may only settle an open order.
+# A PENDING callback settles nothing, it only marks the order for reconciliation.
+CALLBACK_TRANSITIONS = {
+    "success": ["pending", "processing", "expired", "failed"],
+    "failed": ["pending", "processing"],
+    "processing": ["pending"]
+}
+
+
+def callback_order_status(paytm_status: Optional[str]) -> str:
+    """Order status a callback's STATUS moves the order to"""
+    if paytm_status == 'TXN_SUCCESS':
+        return "success"
+    if paytm_status == 'TXN_FAILURE':
+        return "failed"
+    # PENDING: Paytm has no outcome yet, a later callback or the reconciler settles it
+    return "processing"
+
+
+def payment_result_url(order_id: str, status: str) -> str:
+    """Frontend page the customer is sent to after a callback"""
+    frontend_url = BACKEND_URL.replace(':8001', ':3000').replace('api.', '')
+    page = "payment-success" if status == "success" else "payment-failed"
+    return f"{frontend_url}/{page}?order_id={order_id}"
+
+
+async def apply_payment_callback(paytm_params: dict) -> Optional[str]:
+    """
+    Apply a verified Paytm callback as one conditional state transition
+    Returns: the order's status afterwards, or None if the order does not exist
+    """
+    order_id = paytm_params.get('ORDERID')
+    new_status = callback_order_status(paytm_params.get('STATUS'))
+    
+    update = {"status": new_status, "gateway_response": paytm_params}
+    if new_status == "success":
+        update["verified_at"] = datetime.now(timezone.utc)
+        update["payment_gateway_txn_id"] = paytm_params.get('TXNID')
+    
+    previous = await db.orders.find_one_and_update(
+        {"order_id": order_id, "status": {"$in": CALLBACK_TRANSITIONS[new_status]}},
+        {"$set": update, "$unset": {"reconcile_next_at": ""}},
+        projection={"_id": 0, "gateway_response": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    
+    if previous is not None:
+        await notify_order_update(previous, new_status)
+        return new_status
+    
+    # No transition: the order is unknown or already in a state this callback cannot change
+    current = await db.orders.find_one({"order_id": order_id}, {"_id": 0, "status": 1})
+    if not current:
+        return None
+    
+    logger.info("Callback for %s left order %s (callback reported %s)", order_id, current['status'], new_status)
+    return current['status']
+
+
 @router.post("/payment/callback")
 async def payment_callback(request: Request):
     """
@@ -426,7 +834,7 @@ async def payment_callback(request: Request):
         form_data = await request.form()
         paytm_params = dict(form_data)
         
-        logger.info(f"Paytm callback received: {paytm_params}")
+        logger.info("Paytm callback received: %s", paytm_params)
         
         # Extract checksum
         checksum = paytm_params.pop('CHECKSUMHASH', None)
@@ -435,8 +843,9 @@ async def payment_callback(request: Request):
             logger.error("No checksum in callback")
             raise HTTPException(status_code=400, detail="Invalid callback data")
         
-        # Verify checksum
-        if not verify_paytm_checksum(paytm_params, checksum):
+        # Verify checksum, unless the queue workers verify it in batches
+        defer_verification = PAYTM_CALLBACK_MODE == "queue" and CALLBACK_QUEUE_DEFER_VERIFY
+        if not defer_verification and not await verify_paytm_checksum(paytm_params, checksum):
             logger.error("Checksum verification failed")
             raise HTTPException(status_code=400, detail="Invalid checksum")
         
@@ -451,182 +860,435 @@ async def payment_callback(request: Request):
             logger.error("No order ID in callback")
             raise HTTPException(status_code=400, detail="Invalid transaction data")
         
-        # Find order
-        order = await db.orders.find_one({"order_id": order_id}, {"_id": 0})
+        # Paytm retries callbacks; answer a retry we already applied without touching the database
+        # (a PENDING callback may be followed by the final one for the same transaction)
+        dedup_key = (order_id, txn_id, status)
+        final_status = await callback_dedup_cache.get(dedup_key)
         
-        if not order:
-            logger.error(f"Order not found for: {order_id}")
-            raise HTTPException(status_code=404, detail="Order not found")
+        if final_status is None and PAYTM_CALLBACK_MODE == "queue":
+            # Durable ingest: workers apply it later, the customer is redirected right away
+            await callback_queue.enqueue(paytm_params, checksum=checksum if defer_verification else None)
+            reported_status = "success" if status == 'TXN_SUCCESS' else "failed"
+            if reported_status == "failed":
+                # A late failure retry cannot undo a success, send the customer to the page for the order's actual state
+                current = await db.orders.find_one({"order_id": order_id}, {"_id": 0, "status": 1})
+                if current and current['status'] == 'success':
+                    reported_status = "success"
+            return RedirectResponse(url=payment_result_url(order_id, reported_status))
         
-        # Check payment status
-        if status == 'TXN_SUCCESS':
-            # Payment successful
-            verified_at = datetime.now(timezone.utc)
+        if final_status is None:
+            final_status = await apply_payment_callback(paytm_params)
             
-            await db.orders.update_one(
-                {"order_id": order_id},
-                {
-                    "$set": {
-                        "status": "success",
-                        "verified_at": verified_at.isoformat(),
-                        "payment_gateway_txn_id": txn_id,
-                        "gateway_response": paytm_params
-                    }
-                }
-            )
+            if final_status is None:
+                logger.error("Order not found for: %s", order_id)
+                raise HTTPException(status_code=404, detail="Order not found")
             
-            logger.info(f"Payment successful: {order_id}")
+            await callback_dedup_cache.set(dedup_key, final_status)
             
-            # Redirect to success page
-            frontend_url = BACKEND_URL.replace(':8001', ':3000').replace('api.', '')
-            return RedirectResponse(url=f"{frontend_url}/payment-success?order_id={order_id}")
-        
+            if final_status == 'success' and status == 'TXN_SUCCESS':
+                logger.info("Payment successful: %s", order_id)
+            elif final_status == 'failed' and status != 'TXN_SUCCESS':
+                logger.warning("Payment failed: %s, Status: %s, Msg: %s", order_id, status, resp_msg)
         else:
-            # Payment failed
-            await db.orders.update_one(
-                {"order_id": order_id},
-                {
-                    "$set": {
-                        "status": "failed",
-                        "gateway_response": paytm_params
-                    }
-                }
-            )
-            
-            logger.warning(f"Payment failed: {order_id}, Status: {status}, Msg: {resp_msg}")
-            
-            # Redirect to failure page
-            frontend_url = BACKEND_URL.replace(':8001', ':3000').replace('api.', '')
-            return RedirectResponse(url=f"{frontend_url}/payment-failed?order_id={order_id}")
+            logger.info("Duplicate callback for %s (%s) answered from cache", order_id, txn_id)
+        
+        # Redirect to the page for the order's actual state, a late failure cannot undo a success
+        return RedirectResponse(url=payment_result_url(order_id, final_status))
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Callback error: {str(e)}")
+        logger.error("Callback error: %s", e)
         raise HTTPException(status_code=500, detail=f"Callback processing failed: {str(e)}")
 
 
+def local_payment_status(order: dict) -> PaymentStatusResponse:
+    """Build a status response from the order as stored in the database"""
+    return PaymentStatusResponse(
+        success=order['status'] == 'success',
+        status=order['status'].upper(),
+        transaction_id=order.get('payment_gateway_txn_id') or '',
+        order_id=order['order_id'],
+        amount=order['unique_amount'],
+        message=f"Payment status: {order['status']}"
+    )
+
+
+async def settle_from_status_check(order_id: str, status: str, fields: dict) -> Optional[PaymentStatusResponse]:
+    """
+    Apply Paytm's final answer to an order that is still open
+    Returns None when applied, or the local status when a callback or another check settled it first
+    """
+    previous = await db.orders.find_one_and_update(
+        {"order_id": order_id, "status": {"$in": ['pending', 'processing']}},
+        {"$set": {"status": status, **fields}, "$unset": {"reconcile_next_at": ""}},
+        projection={"_id": 0, "gateway_response": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is not None:
+        await notify_order_update(previous, status)
+        return None
+    
+    current = await db.orders.find_one({"order_id": order_id}, {"_id": 0})
+    if not current:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return local_payment_status(current)
+
+
+async def resolve_payment_status(order_id: str) -> PaymentStatusResponse:
+    """
+    Resolve payment status for an order from the database and Paytm
+    Updates the order when Paytm reports a final state
+    """
+    # 1. Get order from database
+    order = await db.orders.find_one({"order_id": order_id}, {"_id": 0})
+    
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    # Final states are settled locally, Paytm has nothing new to tell us
+    # (expired orders had a last Paytm check when they expired)
+    if order['status'] in TERMINAL_ORDER_STATUSES:
+        return local_payment_status(order)
+    
+    # Paytm is failing or too slow: answer from our own state instead of waiting on it
+    if paytm_client.circuit_open:
+        return local_payment_status(order)
+    
+    # 2. Check with Paytm
+    paytm_response = await get_payment_status_from_paytm(order_id)
+    
+    if not paytm_response["success"]:
+        # Return local status if Paytm check fails
+        return local_payment_status(order)
+    
+    # 3. Parse Paytm response
+    response_data = paytm_response["data"]
+    result_status = extract_result_status(response_data)
+    
+    if result_status == "TXN_SUCCESS":
+        settled = await settle_from_status_check(order_id, "success", {
+            "verified_at": datetime.now(timezone.utc),
+            "gateway_response": response_data
+        })
+        if settled is not None:
+            return settled
+        
+        return PaymentStatusResponse(
+            success=True,
+            status="SUCCESS",
+            transaction_id=order.get('payment_gateway_txn_id') or '',
+            order_id=order_id,
+            amount=order['unique_amount'],
+            message="Payment completed successfully"
+        )
+    
+    elif result_status == "TXN_FAILURE":
+        settled = await settle_from_status_check(order_id, "failed", {"gateway_response": response_data})
+        if settled is not None:
+            return settled
+        
+        return PaymentStatusResponse(
+            success=False,
+            status="FAILED",
+            transaction_id=order.get('payment_gateway_txn_id') or '',
+            order_id=order_id,
+            amount=order['unique_amount'],
+            message="Payment failed"
+        )
+    
+    else:
+        # Pending or other status
+        return PaymentStatusResponse(
+            success=False,
+            status="PENDING",
+            transaction_id=order.get('payment_gateway_txn_id') or '',
+            order_id=order_id,
+            amount=order['unique_amount'],
+            message="Payment is being processed"
+        )
+
+
+async def lookup_payment_status(order_id: str) -> PaymentStatusResponse:
+    """Resolve payment status and cache the answer (success without expiry)"""
+    generation = await order_generations.get(order_id)
+    result = await resolve_payment_status(order_id)
+    # The order changed while resolving (e.g. a callback landed), this answer may already be stale
+    if await order_generations.get(order_id) != generation:
+        return result
+    ttl = None if result.status.lower() in FINAL_ORDER_STATUSES else PAYMENT_STATUS_CACHE_TTL
+    await payment_status_cache.set(order_id, result.model_dump(), ttl=ttl)
+    return result
+
+
 @router.get("/payment/status/{order_id}", response_model=PaymentStatusResponse)
 async def check_payment_status(order_id: str):
     """
     Check payment status by order_id
     Makes a server-to-server call to Paytm to verify transaction status
+    Concurrent checks for the same order share one database read and one Paytm call
+    Recent answers are served from the payment status cache
     """
     try:
-        # 1. Get order from database
-        order = await db.orders.find_one({"order_id": order_id}, {"_id": 0})
-        
-        if not order:
-            raise HTTPException(status_code=404, detail="Order not found")
-        
-        # 2. Check with Paytm
-        paytm_response = get_payment_status_from_paytm(order_id)
-        
-        if not paytm_response["success"]:
-            # Return local status if Paytm check fails
-            return PaymentStatusResponse(
-                success=order['status'] == 'success',
-                status=order['status'].upper(),
-                transaction_id=order.get('payment_gateway_txn_id', ''),
-                order_id=order_id,
-                amount=order['unique_amount'],
-                message=f"Payment status: {order['status']}"
-            )
-        
-        # 3. Parse Paytm response
-        response_data = paytm_response["data"]
-        result_status = response_data.get("body", {}).get("resultInfo", {}).get("resultStatus")
-        
-        if result_status == "TXN_SUCCESS":
-            # Update order if not already marked as success
-            if order['status'] != 'success':
-                verified_at = datetime.now(timezone.utc)
-                
-                await db.orders.update_one(
-                    {"order_id": order_id},
-                    {
-                        "$set": {
-                            "status": "success",
-                            "verified_at": verified_at.isoformat(),
-                            "gateway_response": response_data
-                        }
-                    }
-                )
-            
-            return PaymentStatusResponse(
-                success=True,
-                status="SUCCESS",
-                transaction_id=order.get('payment_gateway_txn_id', ''),
-                order_id=order_id,
-                amount=order['unique_amount'],
-                message="Payment completed successfully"
+        cached = await payment_status_cache.get(order_id)
+        if cached is not None:
+            status_response = PaymentStatusResponse(**cached)
+        else:
+            status_response = await payment_status_flight.do(
+                order_id,
+                lambda: lookup_payment_status(order_id)
             )
         
-        elif result_status == "TXN_FAILURE":
-            # Update order status
-            if order['status'] != 'failed':
-                await db.orders.update_one(
-                    {"order_id": order_id},
-                    {"$set": {"status": "failed", "gateway_response": response_data}}
-                )
-            
-            return PaymentStatusResponse(
-                success=False,
-                status="FAILED",
-                transaction_id=order.get('payment_gateway_txn_id', ''),
-                order_id=order_id,
-                amount=order['unique_amount'],
-                message="Payment failed"
-            )
+        if FAST_ORDER_RESPONSES:
+            response = payment_status_encoder.response(status_response.model_dump())
+            if response is not None:
+                return response
         
-        else:
-            # Pending or other status
-            return PaymentStatusResponse(
-                success=False,
-                status="PENDING",
-                transaction_id=order.get('payment_gateway_txn_id', ''),
-                order_id=order_id,
-                amount=order['unique_amount'],
-                message="Payment is being processed"
-            )
+        return status_response
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error checking payment status: {str(e)}")
+        logger.error("Error checking payment status: %s", e)
         raise HTTPException(status_code=500, detail=f"Status check failed: {str(e)}")
 
 
+# ==================== BACKGROUND WORKERS ====================
+
+RECONCILER_ENABLED = os.environ.get('RECONCILER_ENABLED', 'true').lower() == 'true'
+payment_reconciler = PaymentReconciler.from_env(
+    db,
+    get_payment_status_from_paytm,
+    on_transition=notify_order_update
+)
+
+ORDER_EXPIRY_ENABLED = os.environ.get('ORDER_EXPIRY_ENABLED', 'true').lower() == 'true'
+# Overdue processing orders get one last Paytm check before they are expired
+order_expiry = OrderExpirySweeper.from_env(
+    db,
+    on_transition=notify_order_update,
+    check_payment=payment_reconciler.check_order
+)
+
+callback_queue = CallbackQueue.from_env(
+    db,
+    apply_payment_callback,
+    verify_batch=checksum_executor.verify_many
+)
+
+
 # ==================== ADMIN ENDPOINTS ====================
 
 @router.get("/admin/orders")
-async def get_all_orders():
-    """Get all orders (admin endpoint)"""
-    orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+async def get_all_orders(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    product_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    include_gateway_response: bool = False
+):
+    """
+    List orders newest first (admin endpoint)
+    Pass next_cursor from the previous page as `cursor` to fetch the next page
+    """
+    query = build_order_filter(status, product_id, created_from, created_to)
+    
+    if cursor:
+        try:
+            query = {"$and": [query, after_cursor(cursor)]}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    projection = {"_id": 0} if include_gateway_response else ORDER_LIST_PROJECTION
+    
+    # Fetch one extra row to know whether another page exists
+    orders = await db.orders.find(query, projection).sort(ORDER_LIST_SORT).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1])
+    
+    payload = {"orders": orders, "count": len(orders), "next_cursor": next_cursor}
+    if FAST_ORDER_RESPONSES and all(portable(order) for order in orders):
+        return FastJSONResponse(payload)
+    return payload
+
+
+@router.get("/admin/orders/export")
+async def export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = None,
+    product_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    batch_size: int = Query(1000, ge=1, le=10000)
+):
+    """
+    Stream every matching order as NDJSON or CSV, oldest first (admin endpoint)
+    `fields` is a comma separated list of order fields to include
+    """
+    try:
+        selected_fields = parse_export_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    for order in orders:
-        if isinstance(order.get('created_at'), str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order.get('payment_window_expires'), str):
-            order['payment_window_expires'] = datetime.fromisoformat(order['payment_window_expires'])
-        if order.get('verified_at') and isinstance(order['verified_at'], str):
-            order['verified_at'] = datetime.fromisoformat(order['verified_at'])
+    query = build_order_filter(status, product_id, created_from, created_to)
     
-    return {"orders": orders, "count": len(orders)}
+    return StreamingResponse(
+        stream_orders(db.orders, query, selected_fields, format, batch_size),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    )
+
+
+@router.get("/admin/stats")
+async def get_order_stats(
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    product_id: Optional[str] = None
+):
+    """
+    Order counts, revenue and conversion for orders created in a time range (admin endpoint)
+    Served from hourly rollups, so the range is applied at hour granularity
+    """
+    return await order_stats.summary(created_from, created_to, product_id)
+
+
+@router.get("/admin/callback-queue")
+async def get_callback_queue_stats():
+    """Callback queue depth by state and worker counters (admin endpoint)"""
+    return {
+        "mode": PAYTM_CALLBACK_MODE,
+        "depth": await callback_queue.depth(),
+        "workers": callback_queue.stats()
+    }
+
+
+@router.get("/admin/gateway")
+async def get_gateway_stats():
+    """Paytm circuit breaker state and adaptive timeouts per endpoint"""
+    return paytm_client.stats()
+
+
+@router.get("/admin/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters and memory use of the in-process caches and request coalescing"""
+    return {
+        "order_cache": order_cache.stats(),
+        "payment_status_cache": payment_status_cache.stats(),
+        "payment_status_flight": payment_status_flight.stats(),
+        "callback_dedup_cache": callback_dedup_cache.stats(),
+        "cache_backend": cache_backend.stats()
+    }
+
+
+@router.get("/admin/logging")
+async def get_logging_stats():
+    """Log records waiting to be written and records dropped by sampling or a full queue"""
+    return log_pipeline.stats()
+
+
+@router.get("/admin/tracing")
+async def get_tracing_stats():
+    """Sampling rate and exported/dropped span counts"""
+    return tracer.stats()
 
 
 # Include the router in the main app
 app.include_router(router, prefix="/api")
 app.include_router(router)
 
+if METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        """Prometheus scrape endpoint"""
+        return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+if tracer.enabled:
+    app.add_middleware(tracing.TracingMiddleware, tracer=tracer)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[tracing.TRACE_ID_RESPONSE_HEADER],
 )
 
+@app.on_event("startup")
+async def startup_tracer():
+    tracer.start()
+
+@app.on_event("shutdown")
+async def shutdown_tracer():
+    tracer.stop()
+
+@app.on_event("startup")
+async def startup_db_indexes():
+    if MONGO_ENSURE_INDEXES:
+        await ensure_indexes(db)
+
+@app.on_event("startup")
+async def startup_paytm_client():
+    checksum_executor.start()
+    await paytm_client.start()
+
+@app.on_event("startup")
+async def startup_order_cache():
+    await order_cache.start()
+
+@app.on_event("shutdown")
+async def shutdown_order_cache():
+    await order_cache.stop()
+
+@app.on_event("startup")
+async def startup_reconciler():
+    if RECONCILER_ENABLED:
+        await payment_reconciler.start()
+
+@app.on_event("shutdown")
+async def shutdown_reconciler():
+    await payment_reconciler.stop()
+
+@app.on_event("startup")
+async def startup_order_expiry():
+    if ORDER_EXPIRY_ENABLED:
+        await order_expiry.start()
+
+@app.on_event("shutdown")
+async def shutdown_order_expiry():
+    await order_expiry.stop()
+
+@app.on_event("startup")
+async def startup_callback_queue():
+    if PAYTM_CALLBACK_MODE == "queue":
+        await callback_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_callback_queue():
+    await callback_queue.stop()
+
+@app.on_event("shutdown")
+async def shutdown_paytm_client():
+    await paytm_client.close()
+    checksum_executor.close()
+
+@app.on_event("shutdown")
+async def shutdown_cache_backend():
+    await cache_backend.close()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+
+@app.on_event("shutdown")
+async def shutdown_log_pipeline():
+    # Last, so records from the other shutdown hooks are flushed
+    log_pipeline.stop()
@@ -0,0 +1,445 @@
+"""
+Lightweight request tracing.
+
+TracingMiddleware starts one trace per HTTP request. The trace id comes from
+an incoming W3C `traceparent` header or from TRACE_ID_HEADER (x-trace-id),
+otherwise a new one is generated; it is always returned in the x-trace-id
+response header so a slow checkout can be looked up.
+
+Only sampled requests record anything. The sampling decision is made once
+per request: an upstream traceparent's sampled flag is respected, otherwise
+TRACE_SAMPLE_RATE applies. Inside a sampled request:
+
+- span() wraps any block of code, e.g. checksum signing or a Paytm call;
+  outside a sampled request it returns a shared no-op span
+- MongoTraceListener, a pymongo CommandListener, turns every Mongo command
+  into a child span (Motor copies the context into its worker threads)
+
+Finished spans go through a bounded queue to a background thread that
+exports them in batches, either as JSON lines to TRACE_FILE or to a
+Zipkin-compatible collector (Zipkin, Jaeger, the OpenTelemetry collector)
+at TRACE_COLLECTOR_URL. Spans are dropped rather than queued without bound.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from pymongo import monitoring
+
+
+logger = logging.getLogger(__name__)
+
+
+TRACE_EXPORTERS = ("none", "file", "zipkin")
+
+TRACE_ID_RESPONSE_HEADER = "x-trace-id"
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_TRACE_ID = re.compile(r"^(?:[0-9a-f]{16}|[0-9a-f]{32})$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+class Span:
+    """One timed operation in a sampled trace"""
+
+    __slots__ = (
+        "processor", "trace_id", "span_id", "parent_id", "name", "kind",
+        "attributes", "error", "start_time", "_started", "duration",
+    )
+
+    def __init__(
+        self,
+        processor: "BatchSpanProcessor",
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: str = "internal",
+        attributes: Optional[dict] = None,
+    ):
+        self.processor = processor
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def child(self, name: str, kind: str = "internal", attributes: Optional[dict] = None) -> "Span":
+        return Span(self.processor, name, self.trace_id, self.span_id, kind, attributes)
+
+    def finish(self, duration: Optional[float] = None):
+        if self.duration is not None:
+            return
+        self.duration = duration if duration is not None else time.perf_counter() - self._started
+        self.processor.submit(self)
+
+
+class _NoopSpan:
+    """Stands in for a span outside sampled requests"""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes) -> Iterator:
+    """Time the enclosed block as a child of the current span; a no-op when the request is not sampled"""
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = parent.child(name, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+
+def _timestamp(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec="microseconds")
+
+
+class FileSpanExporter:
+    """Appends spans to a file as JSON lines"""
+
+    def __init__(self, path: str, service_name: str = "techstore-backend"):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, spans: List[Span]):
+        lines = [
+            json.dumps({
+                "service": self.service_name,
+                "trace_id": s.trace_id,
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "name": s.name,
+                "kind": s.kind,
+                "start": _timestamp(s.start_time),
+                "duration_ms": round(s.duration * 1000, 3),
+                "attributes": s.attributes,
+                "error": s.error,
+            }, default=str)
+            for s in spans
+        ]
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def close(self):
+        pass
+
+
+class ZipkinSpanExporter:
+    """Posts spans in the Zipkin v2 JSON format to a collector"""
+
+    _KINDS = {"server": "SERVER", "client": "CLIENT"}
+
+    def __init__(self, url: str, service_name: str = "techstore-backend", timeout: float = 5.0):
+        self.url = url
+        self.service_name = service_name
+        self._client = httpx.Client(timeout=timeout)
+
+    def _encode(self, s: Span) -> dict:
+        encoded = {
+            "traceId": s.trace_id,
+            "id": s.span_id,
+            "name": s.name,
+            "timestamp": int(s.start_time * 1_000_000),
+            "duration": max(1, int(s.duration * 1_000_000)),
+            "localEndpoint": {"serviceName": self.service_name},
+            "tags": {key: str(value) for key, value in s.attributes.items()},
+        }
+        if s.parent_id:
+            encoded["parentId"] = s.parent_id
+        if s.kind in self._KINDS:
+            encoded["kind"] = self._KINDS[s.kind]
+        if s.error:
+            encoded["tags"]["error"] = s.error
+        return encoded
+
+    def export(self, spans: List[Span]):
+        response = self._client.post(self.url, json=[self._encode(s) for s in spans])
+        response.raise_for_status()
+
+    def close(self):
+        self._client.close()
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them in batches from a background thread"""
+
+    def __init__(self, exporter, max_queue: int = 4096, batch_size: int = 256, interval: float = 2.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.exported = 0
+        self.dropped = 0
+        self.export_errors = 0
+
+    def submit(self, finished: Span):
+        # Called from the event loop and Motor's worker threads; never blocks
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Export whatever is still queued and stop the thread"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        self.exporter.close()
+
+    def _drain(self) -> List[Span]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            stopping = self._stopping.wait(self.interval)
+            batch = self._drain()
+            while batch:
+                self._export(batch)
+                batch = self._drain() if len(batch) == self.batch_size else []
+            if stopping:
+                return
+
+    def _export(self, batch: List[Span]):
+        try:
+            self.exporter.export(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.export_errors += 1
+            self.dropped += len(batch)
+            logger.warning("Exporting %s spans failed: %s", len(batch), e)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "export_errors": self.export_errors,
+        }
+
+
+class Tracer:
+    """Sampling decisions and the span processor for request traces"""
+
+    def __init__(
+        self,
+        processor: Optional[BatchSpanProcessor] = None,
+        sample_rate: float = 1.0,
+        trace_id_header: str = "x-trace-id",
+    ):
+        self.processor = processor
+        self.sample_rate = sample_rate
+        self.trace_id_header = trace_id_header.lower().encode("latin-1")
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """Build a tracer from TRACE_* environment variables; TRACE_EXPORTER=none disables tracing"""
+        kind = os.environ.get('TRACE_EXPORTER', 'none').lower()
+        service_name = os.environ.get('TRACE_SERVICE_NAME', 'techstore-backend')
+        if kind == "none":
+            exporter = None
+        elif kind == "file":
+            exporter = FileSpanExporter(os.environ.get('TRACE_FILE', 'spans.jsonl'), service_name)
+        elif kind == "zipkin":
+            exporter = ZipkinSpanExporter(
+                os.environ.get('TRACE_COLLECTOR_URL', 'http://localhost:9411/api/v2/spans'), service_name
+            )
+        else:
+            raise ValueError(f"Unknown trace exporter: {kind}")
+        return cls(
+            processor=BatchSpanProcessor(exporter) if exporter else None,
+            sample_rate=float(os.environ.get('TRACE_SAMPLE_RATE', 0.01)),
+            trace_id_header=os.environ.get('TRACE_ID_HEADER', 'x-trace-id'),
+        )
+
+    def start(self):
+        if self.processor:
+            self.processor.start()
+
+    def stop(self):
+        if self.processor:
+            self.processor.stop()
+
+    def incoming_context(self, headers: List[Tuple[bytes, bytes]]) -> Tuple[str, Optional[str], bool]:
+        """(trace_id, parent_span_id, sampled) for a request with these raw ASGI headers"""
+        traceparent = None
+        trace_id = None
+        for name, value in headers:
+            if name == b"traceparent":
+                traceparent = _TRACEPARENT.match(value.decode("latin-1").strip().lower())
+            elif name == self.trace_id_header:
+                candidate = value.decode("latin-1").strip().lower()
+                if _TRACE_ID.match(candidate):
+                    trace_id = candidate.rjust(32, "0")
+
+        if traceparent:
+            sampled = bool(int(traceparent.group(3), 16) & 1) or random.random() < self.sample_rate
+            return traceparent.group(1), traceparent.group(2), sampled
+        return trace_id or new_trace_id(), None, random.random() < self.sample_rate
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            **(self.processor.stats() if self.processor else {}),
+        }
+
+
+class TracingMiddleware:
+    """Starts a trace per HTTP request and returns its id in the x-trace-id header"""
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_id, sampled = self.tracer.incoming_context(scope["headers"])
+        status = {"code": 500}
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (TRACE_ID_RESPONSE_HEADER.encode("latin-1"), trace_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        if not sampled:
+            await self.app(scope, receive, send_with_trace_id)
+            return
+
+        root = Span(self.tracer.processor, scope["method"], trace_id, parent_id, kind="server")
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            root.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            root.name = f"{scope['method']} {route_path}"
+            root.attributes.update({
+                "http.method": scope["method"],
+                "http.route": route_path,
+                "http.target": scope["path"],
+                "http.status_code": status["code"],
+            })
+            if status["code"] >= 500 and root.error is None:
+                root.set_error(f"HTTP {status['code']}")
+            root.finish()
+
+
+class MongoTraceListener(monitoring.CommandListener):
+    """pymongo command listener recording a span per command inside sampled requests"""
+
+    def __init__(self):
+        self._spans: Dict[Tuple[object, int], Span] = {}
+
+    def _key(self, event) -> Tuple[object, int]:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        # getMore names the cursor id first and the collection separately
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self._spans[self._key(event)] = parent.child(
+            f"mongo.{event.command_name}",
+            kind="client",
+            attributes={
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.collection": target if isinstance(target, str) else "",
+            },
+        )
+
+    def succeeded(self, event):
+        command_span = self._spans.pop(self._key(event), None)
+        if command_span is not None:
+            command_span.finish(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        command_span = self._spans.pop(self._key(event), None)
+        if command_span is not None:
+            command_span.set_error(str(event.failure.get("errmsg", "command failed")))
+            command_span.finish(event.duration_micros / 1e6)
@@ -0,0 +1,42 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+# server.py needs these to import; nothing connects to MongoDB or Paytm in these tests
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "techstore_tests")
+os.environ.setdefault("PAYTM_KEY", "TESTMERCHANTKEY1")  # AES-128 needs a 16 byte key
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+BENCHMARK_STORAGE = ROOT_DIR / "tests" / ".benchmarks"
+
+
+@pytest.fixture
+def mongo_db():
+    """An in-memory stand-in for the Motor database"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient(tz_aware=True)["techstore_tests"]
+
+
+@pytest.fixture
+def server_db(mongo_db, monkeypatch):
+    """server.py with its database, and every component holding it, pointed at mongo_db"""
+    import server
+
+    monkeypatch.setattr(server, "db", mongo_db)
+    for component in vars(server).values():
+        if not isinstance(component, type) and "db" in getattr(component, "__dict__", {}):
+            monkeypatch.setattr(component, "db", mongo_db)
+    return mongo_db
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Keep saved benchmark runs in one place whatever directory pytest is started from
+    if config.pluginmanager.hasplugin("benchmark") and config.getoption("benchmark_storage") == "file://./.benchmarks":
+        config.option.benchmark_storage = BENCHMARK_STORAGE.as_uri()
@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import amount_allocator
+from amount_allocator import AmountAllocationError, UniqueAmountAllocator, to_paise
+
+
+def expires_in(minutes: float = 5) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(minutes=minutes)
+
+
+async def lease(db, base_amount: float, offset: int, holder: str = "other-worker"):
+    base_paise = to_paise(base_amount)
+    await db.amount_leases.insert_one({
+        "_id": f"{base_paise}:{offset}",
+        "base_paise": base_paise,
+        "offset": offset,
+        "holder": holder,
+        "expires_at": expires_in(),
+    })
+
+
+def test_allocations_get_distinct_offsets(mongo_db):
+    allocator = UniqueAmountAllocator(mongo_db)
+
+    async def run():
+        return [await allocator.allocate(499.0, f"order-{n}", expires_in()) for n in range(20)]
+
+    offsets = asyncio.run(run())
+    assert len(set(offsets)) == 20
+    assert all(1 <= offset <= 99 for offset in offsets)
+    assert allocator.collisions == 0
+
+
+def test_collision_refreshes_taken_slots(mongo_db, monkeypatch):
+    allocator = UniqueAmountAllocator(mongo_db)
+    # Always try the lowest free offset, so the first claim is sure to collide
+    monkeypatch.setattr(amount_allocator.random, "choice", min)
+
+    async def run():
+        # Another worker holds every offset but 42; this one has not seen any of them
+        for offset in range(1, 100):
+            if offset != 42:
+                await lease(mongo_db, 499.0, offset)
+        return await allocator.allocate(499.0, "order-1", expires_in())
+
+    assert asyncio.run(run()) == 42
+    # The collision re-read the leases, so the second claim went straight to the free slot
+    assert allocator.collisions == 1
+    assert allocator.claims == 2
+    assert len(allocator._taken[to_paise(499.0)]) == 99
+
+
+def test_expired_lease_can_be_reclaimed(mongo_db):
+    allocator = UniqueAmountAllocator(mongo_db, max_offset=1)
+
+    async def run():
+        await mongo_db.amount_leases.insert_one({
+            "_id": f"{to_paise(499.0)}:1", "base_paise": to_paise(499.0), "offset": 1,
+            "holder": "old-order", "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1),
+        })
+        offset = await allocator.allocate(499.0, "order-1", expires_in())
+        return offset, await mongo_db.amount_leases.find_one({"_id": f"{to_paise(499.0)}:1"})
+
+    offset, stored = asyncio.run(run())
+    assert offset == 1
+    assert stored["holder"] == "order-1"
+
+
+def test_exhausted_offsets_raise(mongo_db):
+    allocator = UniqueAmountAllocator(mongo_db)
+
+    async def run():
+        for n in range(99):
+            await allocator.allocate(499.0, f"order-{n}", expires_in())
+        await allocator.allocate(499.0, "order-99", expires_in())
+
+    with pytest.raises(AmountAllocationError):
+        asyncio.run(run())
+
+
+def test_release_frees_the_offset(mongo_db):
+    allocator = UniqueAmountAllocator(mongo_db, max_offset=1)
+
+    async def run():
+        offset = await allocator.allocate(499.0, "order-1", expires_in())
+        await allocator.release(499.0, offset, "order-1")
+        return await allocator.allocate(499.0, "order-2", expires_in())
+
+    assert asyncio.run(run()) == 1
+
+
+def test_create_order_returns_503_when_every_offset_is_leased(server_db, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "amount_allocator", UniqueAmountAllocator(server_db))
+
+    async def run():
+        for offset in range(1, 100):
+            await lease(server_db, 499.0, offset)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/orders", json={"product_id": "p1", "product_name": "P", "amount": 499.0})
+
+    response = asyncio.run(run())
+    assert response.status_code == 503
+    assert "payment amounts" in response.json()["detail"]
+
+
+async def insert_leased_order(db, allocator, status: str) -> dict:
+    import server
+
+    expires_at = expires_in()
+    order = server.Order(product_id="p1", product_name="P", base_amount=499.0, unique_amount=499.0,
+                         status=status, payment_window_expires=expires_at)
+    offset = await allocator.allocate(499.0, order.id, expires_at)
+    order.unique_amount = server.generate_unique_amount(499.0, offset)
+    await db.orders.insert_one(order.model_dump())
+    return order.model_dump()
+
+
+def test_lease_is_kept_for_a_failed_order_until_the_window_closes(server_db, monkeypatch):
+    import server
+
+    allocator = UniqueAmountAllocator(server_db)
+    monkeypatch.setattr(server, "amount_allocator", allocator)
+
+    async def run():
+        order = await insert_leased_order(server_db, allocator, "processing")
+        callback = {"ORDERID": order["order_id"], "TXNID": "T1"}
+        await server.apply_payment_callback({**callback, "STATUS": "TXN_FAILURE"})
+        after_failure = await server_db.amount_leases.count_documents({"holder": order["id"]})
+        # A late success may still settle the failed order, so its amount must still be unique
+        await server.apply_payment_callback({**callback, "STATUS": "TXN_SUCCESS"})
+        after_success = await server_db.amount_leases.count_documents({"holder": order["id"]})
+        return after_failure, after_success
+
+    assert asyncio.run(run()) == (1, 0)
@@ -0,0 +1,126 @@
+"""
+Micro-benchmarks for the helpers every checkout runs through.
+
+Compare a change against the committed baseline run:
+    pytest tests/test_benchmarks.py --benchmark-compare=0001 --benchmark-compare-fail=median:20%
+
+Runs are stored under tests/.benchmarks, one directory per platform and
+Python version. 0001_baseline.json is tracked in git, so a fresh clone or CI
+job has something to compare against. Runs saved with --benchmark-autosave
+stay local. On a platform without a baseline, or after an intended speed-up,
+record a new one on the reference machine and commit it:
+    pytest tests/test_benchmarks.py --benchmark-save=baseline
+"""
+import json
+from datetime import datetime, timedelta, timezone
+
+import bson
+import pytest
+from bson.codec_options import CodecOptions
+
+pytest.importorskip("pytest_benchmark")
+
+from amount_allocator import amount_offset, generate_unique_amount  # noqa: E402
+from checksum_pool import PaytmChecksum  # noqa: E402
+from migrations import parse_iso_datetime  # noqa: E402
+from server import PAYTM_KEY, Order  # noqa: E402
+
+
+CREATED_AT = datetime(2024, 3, 1, 10, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def new_order() -> Order:
+    """An order built the way create_order builds one"""
+    return Order(
+        product_id="prod-1",
+        product_name="Wireless Headphones",
+        base_amount=1299.0,
+        unique_amount=generate_unique_amount(1299.0, 37),
+        user_agent="Mozilla/5.0 (X11; Linux x86_64)",
+        ip_address="203.0.113.7",
+        payment_window_expires=CREATED_AT + timedelta(minutes=5),
+    )
+
+
+def paytm_body(order_id: str = "ORD-1A2B3C4D") -> dict:
+    """The initiateTransaction body generate_transaction_token signs"""
+    return {
+        "requestType": "Payment",
+        "mid": "TESTMERCHANT",
+        "websiteName": "WEBSTAGING",
+        "orderId": order_id,
+        "txnAmount": {"value": "1299.37", "currency": "INR"},
+        "userInfo": {"custId": "cust-42", "mobile": "9876543210"},
+        "callbackUrl": "http://localhost:8001/api/payment/callback",
+    }
+
+
+def callback_params() -> dict:
+    return {
+        "ORDERID": "ORD-1A2B3C4D",
+        "MID": "TESTMERCHANT",
+        "TXNID": "20240301111212800110168123456789012",
+        "TXNAMOUNT": "1299.37",
+        "STATUS": "TXN_SUCCESS",
+        "RESPCODE": "01",
+        "RESPMSG": "Txn Success",
+        "PAYMENTMODE": "UPI",
+        "CURRENCY": "INR",
+        "TXNDATE": "2024-03-01 10:31:02.0",
+    }
+
+
+def test_generate_unique_amount(benchmark):
+    assert benchmark(generate_unique_amount, 1299.0, 37) == 1299.37
+
+
+def test_amount_offset(benchmark):
+    assert benchmark(amount_offset, 1299.0, 1299.37) == 37
+
+
+def test_order_construction(benchmark):
+    order = benchmark(new_order)
+    assert order.status == "pending"
+
+
+def test_order_model_dump(benchmark):
+    order = new_order()
+    assert benchmark(order.model_dump)["unique_amount"] == 1299.37
+
+
+def test_order_from_stored_document(benchmark):
+    """What get_order does with a document: decode Motor's BSON with aware datetimes, then validate"""
+    stored = bson.encode({**new_order().model_dump(), "created_at": CREATED_AT})
+    options = CodecOptions(tz_aware=True)
+
+    def read():
+        return Order(**bson.decode(stored, codec_options=options))
+
+    assert benchmark(read).created_at.tzinfo is not None
+
+
+def test_legacy_iso_datetime_parsing(benchmark):
+    """Orders written before datetimes were stored natively keep ISO strings until migrated"""
+    values = [CREATED_AT.isoformat(), (CREATED_AT + timedelta(minutes=5)).isoformat(), "2024-03-01T10:31:02"]
+
+    def parse():
+        return [parse_iso_datetime(value) for value in values]
+
+    assert benchmark(parse)[0] == CREATED_AT
+
+
+def test_paytm_body_json_dumps(benchmark):
+    body = paytm_body()
+    assert json.loads(benchmark(json.dumps, body)) == body
+
+
+def test_checksum_generate_signature(benchmark):
+    body = json.dumps(paytm_body())
+    signature = benchmark(PaytmChecksum.generateSignature, body, PAYTM_KEY)
+    assert PaytmChecksum.verifySignature(body, PAYTM_KEY, signature)
+
+
+def test_checksum_verify_signature(benchmark):
+    params = callback_params()
+    checksum = PaytmChecksum.generateSignature(params, PAYTM_KEY)
+    assert benchmark(PaytmChecksum.verifySignature, params, PAYTM_KEY, checksum)
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from cache_backend import FakeRedis, MemoryCacheBackend, RedisCacheBackend, VersionedCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def backends(clock):
+    return {
+        "memory": MemoryCacheBackend(clock=clock),
+        "redis": RedisCacheBackend(FakeRedis(clock=clock)),
+    }
+
+
+@pytest.mark.parametrize("kind", ["memory", "redis"])
+def test_entries_expire_after_their_ttl(kind):
+    clock = FakeClock()
+    backend = backends(clock)[kind]
+
+    async def run():
+        await backend.set("short", {"status": "PENDING"}, ttl=5)
+        await backend.set("kept", {"status": "SUCCESS"}, ttl=None)
+        before = await backend.get("short")
+        clock.now += 5
+        return before, await backend.get("short"), await backend.get("kept")
+
+    before, after, kept = asyncio.run(run())
+    assert before == {"status": "PENDING"}
+    assert after is None
+    assert kept == {"status": "SUCCESS"}
+
+
+@pytest.mark.parametrize("kind", ["memory", "redis"])
+def test_counters(kind):
+    backend = backends(FakeClock())[kind]
+
+    async def run():
+        return [await backend.version("v"), await backend.incr("v"), await backend.incr("v"), await backend.version("v")]
+
+    assert asyncio.run(run()) == [0, 1, 2, 2]
+
+
+def test_invalidate_all_reaches_other_workers_within_version_ttl():
+    clock = FakeClock()
+    backend = RedisCacheBackend(FakeRedis(clock=clock))
+    first = VersionedCache(backend, "payment_status", ttl=60, version_ttl=1.0, clock=clock)
+    second = VersionedCache(backend, "payment_status", ttl=60, version_ttl=1.0, clock=clock)
+
+    async def run():
+        await first.set("ORD-1", "PENDING")
+        seen = [await second.get("ORD-1")]
+        await first.invalidate_all()
+        seen.append(await first.get("ORD-1"))
+        # The other worker still uses the namespace version it read last
+        seen.append(await second.get("ORD-1"))
+        clock.now += 1
+        seen.append(await second.get("ORD-1"))
+        return seen
+
+    assert asyncio.run(run()) == ["PENDING", None, "PENDING", None]
+
+
+def test_tuple_keys_and_default_ttl():
+    clock = FakeClock()
+    cache = VersionedCache(MemoryCacheBackend(clock=clock), "callback_dedup", ttl=10, clock=clock)
+
+    async def run():
+        await cache.set(("ORD-1", "TXN-1", "TXN_SUCCESS"), "success")
+        hit = await cache.get(("ORD-1", "TXN-1", "TXN_SUCCESS"))
+        other = await cache.get(("ORD-1", "TXN-1", "PENDING"))
+        clock.now += 10
+        return hit, other, await cache.get(("ORD-1", "TXN-1", "TXN_SUCCESS"))
+
+    assert asyncio.run(run()) == ("success", None, None)
+    assert cache.stats()["hits"] == 1
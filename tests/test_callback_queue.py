@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from callback_queue import CallbackQueue
+from indexes import ensure_indexes
+
+
+def params(order_id: str, status: str = "TXN_SUCCESS") -> dict:
+    return {"ORDERID": order_id, "TXNID": f"TXN-{order_id}", "STATUS": status}
+
+
+class FakeApply:
+    def __init__(self, results: dict = None):
+        self.results = results or {}
+        self.applied = []
+
+    async def __call__(self, paytm_params: dict):
+        self.applied.append(paytm_params["ORDERID"])
+        result = self.results.get(paytm_params["ORDERID"], "success")
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+async def entries(db) -> dict:
+    return {entry["params"]["ORDERID"]: entry async for entry in db.callback_queue.find({})}
+
+
+async def make_due(db):
+    """Let retried entries be claimed now instead of after their backoff"""
+    await db.callback_queue.update_many({"state": "queued"}, {"$set": {"available_at": datetime.now(timezone.utc)}})
+
+
+def test_duplicate_callbacks_are_queued_once(mongo_db):
+    queue = CallbackQueue(mongo_db, FakeApply())
+
+    async def run():
+        await ensure_indexes(mongo_db)
+        return [
+            await queue.enqueue(params("ORD-1")),
+            await queue.enqueue(params("ORD-1")),
+            # Same transaction with another status is a different callback
+            await queue.enqueue(params("ORD-1", "PENDING")),
+        ]
+
+    assert asyncio.run(run()) == [True, False, True]
+    assert queue.duplicates == 1
+
+
+def test_drain_applies_and_acknowledges(mongo_db):
+    apply = FakeApply({"ORD-MISSING": None})
+    queue = CallbackQueue(mongo_db, apply)
+
+    async def run():
+        for order_id in ("ORD-1", "ORD-2", "ORD-MISSING"):
+            await queue.enqueue(params(order_id))
+        handled = await queue.drain_once()
+        return handled, await queue.drain_once(), await entries(mongo_db)
+
+    handled, again, stored = asyncio.run(run())
+    assert (handled, again) == (3, 0)
+    assert stored["ORD-1"]["state"] == stored["ORD-2"]["state"] == "done"
+    assert "claim" not in stored["ORD-1"]
+    assert stored["ORD-MISSING"]["state"] == "dead"
+    assert stored["ORD-MISSING"]["error"] == "Order not found"
+
+
+def test_failing_callback_is_retried_then_parked(mongo_db):
+    apply = FakeApply({"ORD-1": RuntimeError("database unavailable")})
+    queue = CallbackQueue(mongo_db, apply, max_attempts=3, retry_backoff=5)
+
+    async def run():
+        await queue.enqueue(params("ORD-1"))
+        await queue.drain_once()
+        first = (await entries(mongo_db))["ORD-1"]
+        for _ in range(2):
+            await make_due(mongo_db)
+            await queue.drain_once()
+        return first, (await entries(mongo_db))["ORD-1"]
+
+    first, last = asyncio.run(run())
+    assert first["state"] == "queued"
+    assert first["available_at"] > datetime.now(timezone.utc)
+    assert last["state"] == "dead"
+    assert last["attempts"] == 3
+    assert apply.applied == ["ORD-1"] * 3
+    assert queue.failed == 3
+
+
+def test_expired_lease_is_claimed_again(mongo_db):
+    apply = FakeApply()
+    queue = CallbackQueue(mongo_db, apply)
+
+    async def run():
+        await queue.enqueue(params("ORD-1"))
+        # A worker claimed the entry and died
+        await mongo_db.callback_queue.update_one({}, {"$set": {
+            "state": "processing", "claim": "dead-worker",
+            "locked_until": datetime.now(timezone.utc) - timedelta(seconds=1),
+        }})
+        return await queue.drain_once(), (await entries(mongo_db))["ORD-1"]
+
+    handled, stored = asyncio.run(run())
+    assert handled == 1
+    assert stored["state"] == "done"
+
+
+def test_live_lease_is_left_alone(mongo_db):
+    queue = CallbackQueue(mongo_db, FakeApply())
+
+    async def run():
+        await queue.enqueue(params("ORD-1"))
+        await mongo_db.callback_queue.update_one({}, {"$set": {
+            "state": "processing", "claim": "other-worker",
+            "locked_until": datetime.now(timezone.utc) + timedelta(seconds=60),
+        }})
+        return await queue.drain_once()
+
+    assert asyncio.run(run()) == 0
+
+
+def test_deferred_checksums_are_verified_in_a_batch(mongo_db):
+    apply = FakeApply()
+    batches = []
+
+    async def verify_batch(items):
+        batches.append(len(items))
+        return [checksum == "good" for _, checksum in items]
+
+    queue = CallbackQueue(mongo_db, apply, verify_batch=verify_batch)
+
+    async def run():
+        await queue.enqueue(params("ORD-1"), checksum="good")
+        await queue.enqueue(params("ORD-2"), checksum="forged")
+        await queue.drain_once()
+        return await entries(mongo_db)
+
+    stored = asyncio.run(run())
+    assert batches == [2]
+    assert apply.applied == ["ORD-1"]
+    assert stored["ORD-2"]["state"] == "dead"
+    assert stored["ORD-2"]["error"] == "Invalid checksum"
+    assert queue.rejected == 1
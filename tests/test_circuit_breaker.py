@@ -0,0 +1,115 @@
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker(
+        name="test",
+        failure_rate=0.5,
+        slow_call_seconds=1.0,
+        slow_call_rate=0.8,
+        min_calls=4,
+        window_seconds=60.0,
+        open_seconds=30.0,
+        half_open_probes=2,
+        clock=clock,
+    )
+
+
+def record_calls(breaker: CircuitBreaker, outcomes, latency: float = 0.1):
+    for ok in outcomes:
+        assert breaker.allow()
+        breaker.record(ok, latency)
+
+
+def test_stays_closed_below_min_calls():
+    breaker = make_breaker(FakeClock())
+    record_calls(breaker, [False, False, False])
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_failure_rate_and_rejects():
+    breaker = make_breaker(FakeClock())
+    record_calls(breaker, [True, False, True, False])
+    assert breaker.state == OPEN
+    assert breaker.rejecting
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+    assert breaker.times_opened == 1
+
+
+def test_opens_on_slow_call_rate():
+    breaker = make_breaker(FakeClock())
+    record_calls(breaker, [True] * 4, latency=2.0)
+    assert breaker.state == OPEN
+
+
+def test_old_failures_leave_the_window():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    record_calls(breaker, [False, False, True])
+    clock.now += 61
+    record_calls(breaker, [True])
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probes_close_the_breaker():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    record_calls(breaker, [False] * 4)
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+
+    # Only half_open_probes calls go through until they report back
+    assert breaker.allow()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    record_calls(breaker, [False] * 4)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+    # The open period starts over from the failed probe
+    clock.now += 29
+    assert breaker.state == OPEN
+    clock.now += 1
+    assert breaker.state == HALF_OPEN
+
+
+def test_slow_probe_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    record_calls(breaker, [False] * 4)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True, 2.0)
+    assert breaker.state == OPEN
+
+
+def test_cancelled_probe_frees_its_slot():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    record_calls(breaker, [False] * 4)
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.allow()
+    breaker.cancel()
+    assert breaker.allow()
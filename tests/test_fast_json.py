@@ -0,0 +1,88 @@
+"""
+The fast JSON path must produce exactly the bytes the response_model path does,
+for every document shape it accepts, and turn down the ones it cannot match.
+"""
+import asyncio
+import random
+
+import httpx
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import fast_json
+import server
+from benchmarks.order_serialization import make_order
+from server import Order, PaymentStatusResponse, local_payment_status
+
+
+random.seed(1)
+ORDERS = [make_order(n) for n in range(200)]
+UNPORTABLE_GATEWAY_RESPONSES = [
+    {"big": 1e20, "txnAmount": 1e-05},
+    {"refunds": [{"amount": 2.5e-07}]},
+    {"nested": {"deeper": [1.5, 1e17]}},
+    {"id": 2 ** 64},
+]
+
+
+def default_body(model, document) -> bytes:
+    """What FastAPI sends for a response_model endpoint returning the document"""
+    field = create_response_field(model.__name__, model)
+    content = asyncio.run(serialize_response(field=field, response_content=document))
+    return JSONResponse(content).body
+
+
+@pytest.mark.parametrize("order", ORDERS, ids=lambda order: order["order_id"])
+def test_order_bytes_match_response_model(order):
+    body = fast_json.TrustedDocumentEncoder(Order).render(order)
+    if body is None:
+        # Turned down documents go through the model, which is only right for unportable ones
+        assert not fast_json.portable(order)
+    else:
+        assert body == default_body(Order, order)
+
+
+@pytest.mark.parametrize("gateway_response", UNPORTABLE_GATEWAY_RESPONSES)
+def test_unportable_numbers_fall_back_to_the_model(gateway_response):
+    order = {**ORDERS[2], "gateway_response": gateway_response}
+    assert not fast_json.portable(order)
+    assert fast_json.TrustedDocumentEncoder(Order).render(order) is None
+
+
+def test_portable_nested_numbers_take_the_fast_path():
+    order = {**ORDERS[2], "gateway_response": {"txnAmount": 499.37, "items": [{"qty": 2, "price": 0.5}]}}
+    assert fast_json.TrustedDocumentEncoder(Order).render(order) == default_body(Order, order)
+
+
+def test_payment_status_bytes_match_response_model():
+    encoder = fast_json.TrustedDocumentEncoder(PaymentStatusResponse)
+    for order in ORDERS:
+        status = local_payment_status(order).model_dump()
+        assert encoder.render(status) == default_body(PaymentStatusResponse, status), order["order_id"]
+
+
+def test_listing_page_matches_jsonable_encoder():
+    page_orders = [order for order in ORDERS if fast_json.portable(order)][:50]
+    page = {"orders": page_orders, "count": len(page_orders), "next_cursor": "cursor"}
+    assert fast_json.dumps(page) == JSONResponse(jsonable_encoder(page)).body
+
+
+def test_get_order_endpoint_bytes_do_not_depend_on_the_fast_path(server_db, monkeypatch):
+    orders = [ORDERS[1], {**ORDERS[2], "gateway_response": UNPORTABLE_GATEWAY_RESPONSES[0]}]
+
+    async def fetch(fast: bool):
+        monkeypatch.setattr(server, "FAST_ORDER_RESPONSES", fast)
+        server.order_cache.clear()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [(await client.get(f"/api/orders/{order['order_id']}")).content for order in orders]
+
+    async def run():
+        await server_db.orders.insert_many([dict(order) for order in orders])
+        return await fetch(True), await fetch(False)
+
+    fast, default = asyncio.run(run())
+    assert fast == default
@@ -0,0 +1,96 @@
+import json
+import logging
+import queue
+
+from log_pipeline import (
+    REDACTED,
+    AsyncQueueHandler,
+    JSONFormatter,
+    RedactingFormatter,
+    SamplingFilter,
+    redact,
+    redact_text
+)
+
+
+def make_record(msg: str, args=(), level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("server", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_redact_replaces_secret_keys_at_any_depth():
+    payload = {
+        "head": {"signature": "abc123"},
+        "body": {"txnToken": "secret-token", "resultInfo": {"resultStatus": "S"}},
+        "CHECKSUMHASH": "hash",
+        "items": [{"customer_mobile": "9876543210"}],
+    }
+    redacted = redact(payload)
+    assert redacted["head"]["signature"] == REDACTED
+    assert redacted["body"]["txnToken"] == REDACTED
+    assert redacted["body"]["resultInfo"] == {"resultStatus": "S"}
+    assert redacted["CHECKSUMHASH"] == REDACTED
+    assert redacted["items"][0]["customer_mobile"] == REDACTED
+    # The caller's data is left as it was
+    assert payload["body"]["txnToken"] == "secret-token"
+
+
+def test_redact_text_masks_secrets_and_mobile_numbers():
+    text = "txnToken=abc&CHECKSUMHASH: 'xyz' call +91 9876543210 about TXNID 20240301111212800110168123456789012"
+    redacted = redact_text(text)
+    assert "abc" not in redacted and "xyz" not in redacted
+    assert "XXXXXX3210" in redacted and "9876543210" not in redacted
+    # Long transaction ids are not mistaken for mobile numbers
+    assert "20240301111212800110168123456789012" in redacted
+
+
+def test_json_formatter_redacts_arguments_and_extra_fields():
+    record = make_record("Paytm response for %s: %s", ("ORD-1", {"txnToken": "secret"}), mobile="9876543210",
+                         order_id="ORD-1")
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry["message"] == f"Paytm response for ORD-1: {{'txnToken': '{REDACTED}'}}"
+    assert entry["mobile"] == REDACTED
+    assert entry["order_id"] == "ORD-1"
+    assert entry["level"] == "INFO"
+
+
+def test_text_formatter_redacts():
+    record = make_record("callback %s", ({"CHECKSUMHASH": "secret", "MOBILE_NO": "9876543210"},))
+    formatted = RedactingFormatter("%(message)s").format(record)
+    assert "secret" not in formatted and "9876543210" not in formatted
+
+
+def test_queued_container_arguments_are_formatted_up_front():
+    handler = AsyncQueueHandler(queue.Queue())
+    payload = {"status": "PENDING", "txnToken": "secret"}
+    prepared = handler.prepare(make_record("response %s", (payload,)))
+    payload["status"] = "TXN_SUCCESS"
+
+    assert prepared.args is None
+    assert "PENDING" in prepared.getMessage()
+    # Key-based redaction no longer sees the dict, the text pattern still catches the secret
+    assert "secret" not in JSONFormatter().format(prepared)
+
+
+def test_queued_scalar_arguments_stay_lazy():
+    handler = AsyncQueueHandler(queue.Queue())
+    prepared = handler.prepare(make_record("order %s paid %s", ("ORD-1", 499.37)))
+    assert prepared.args == ("ORD-1", 499.37)
+    assert prepared.getMessage() == "order ORD-1 paid 499.37"
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = AsyncQueueHandler(queue.Queue(maxsize=1))
+    handler.emit(make_record("first"))
+    handler.emit(make_record("second"))
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+
+def test_sampling_keeps_warnings_and_forced_records():
+    sampler = SamplingFilter(rate=0.0)
+    assert not sampler.filter(make_record("sampled away"))
+    assert sampler.filter(make_record("kept", level=logging.WARNING))
+    assert sampler.filter(make_record("kept", sample=False))
+    assert sampler.dropped == 1
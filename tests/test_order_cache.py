@@ -0,0 +1,160 @@
+import asyncio
+from types import SimpleNamespace
+
+from cache_backend import FakeRedis, RedisCacheBackend, VersionedCache
+from order_cache import OrderCache
+
+
+def shared_cache(db, backend) -> OrderCache:
+    return OrderCache(db, ttl=30, shared=VersionedCache(backend, "orders", ttl=30))
+
+
+class RacingOrders:
+    """db.orders whose find_one lets another worker write before the result is used"""
+
+    def __init__(self, orders, after_read):
+        self.orders = orders
+        self.after_read = after_read
+
+    async def find_one(self, *args, **kwargs):
+        document = await self.orders.find_one(*args, **kwargs)
+        await self.after_read()
+        return document
+
+
+def test_shared_entry_is_visible_to_other_workers(mongo_db):
+    backend = RedisCacheBackend(FakeRedis())
+    first, second = shared_cache(mongo_db, backend), shared_cache(mongo_db, backend)
+
+    async def run():
+        await mongo_db.orders.insert_one({"order_id": "ORD-1", "status": "pending"})
+        await first.get("ORD-1")
+        await mongo_db.orders.delete_one({"order_id": "ORD-1"})
+        # Served from the shared tier, the database no longer has it
+        return await second.get("ORD-1")
+
+    assert asyncio.run(run())["status"] == "pending"
+    assert not second.local
+
+
+def test_invalidation_reaches_other_workers(mongo_db):
+    backend = RedisCacheBackend(FakeRedis())
+    writer, reader = shared_cache(mongo_db, backend), shared_cache(mongo_db, backend)
+
+    async def run():
+        await mongo_db.orders.insert_one({"order_id": "ORD-1", "status": "processing"})
+        await reader.get("ORD-1")
+        await mongo_db.orders.update_one({"order_id": "ORD-1"}, {"$set": {"status": "success"}})
+        await writer.invalidate("ORD-1")
+        return await reader.get("ORD-1")
+
+    assert asyncio.run(run())["status"] == "success"
+
+
+def test_fill_racing_an_update_is_not_served(mongo_db):
+    backend = RedisCacheBackend(FakeRedis())
+    writer = shared_cache(mongo_db, backend)
+
+    async def update_in_between():
+        await mongo_db.orders.update_one({"order_id": "ORD-1"}, {"$set": {"status": "success"}})
+        await writer.invalidate("ORD-1")
+
+    # This worker reads the order just before another worker updates and invalidates it
+    racing = shared_cache(SimpleNamespace(orders=RacingOrders(mongo_db.orders, update_in_between)), backend)
+    reader = shared_cache(mongo_db, backend)
+
+    async def run():
+        await mongo_db.orders.insert_one({"order_id": "ORD-1", "status": "processing"})
+        stale = await racing.get("ORD-1")
+        return stale, await reader.get("ORD-1")
+
+    stale, served = asyncio.run(run())
+    assert stale["status"] == "processing"
+    assert served["status"] == "success"
+
+
+class CountingOrders:
+    """db.orders that counts find_one calls"""
+
+    def __init__(self, orders):
+        self.orders = orders
+        self.reads = 0
+
+    async def find_one(self, *args, **kwargs):
+        self.reads += 1
+        return await self.orders.find_one(*args, **kwargs)
+
+
+def test_local_cache_reads_through_once(mongo_db):
+    orders = CountingOrders(mongo_db.orders)
+    cache = OrderCache(SimpleNamespace(orders=orders), ttl=30)
+
+    async def run():
+        await mongo_db.orders.insert_one({"order_id": "ORD-1", "status": "pending"})
+        results = await asyncio.gather(*[cache.get("ORD-1") for _ in range(5)])
+        results.append(await cache.get("ORD-1"))
+        return results, await cache.get("ORD-MISSING")
+
+    results, missing = asyncio.run(run())
+    assert all(result == {"order_id": "ORD-1", "status": "pending"} for result in results)
+    assert missing is None
+    # One read for ORD-1, shared by the concurrent callers and then cached, one for the miss
+    assert orders.reads == 2
+    assert cache.local
+
+
+def test_invalidate_drops_the_local_copy(mongo_db):
+    cache = OrderCache(mongo_db, ttl=30)
+
+    async def run():
+        await mongo_db.orders.insert_one({"order_id": "ORD-1", "status": "processing"})
+        await cache.get("ORD-1")
+        await mongo_db.orders.update_one({"order_id": "ORD-1"}, {"$set": {"status": "success"}})
+        await cache.invalidate("ORD-1")
+        return await cache.get("ORD-1")
+
+    assert asyncio.run(run())["status"] == "success"
+
+
+def test_read_racing_an_invalidation_is_not_cached(mongo_db):
+    cache = None
+
+    async def invalidate_in_between():
+        await mongo_db.orders.update_one({"order_id": "ORD-1"}, {"$set": {"status": "success"}})
+        await cache.invalidate("ORD-1")
+
+    cache = OrderCache(SimpleNamespace(orders=RacingOrders(mongo_db.orders, invalidate_in_between)), ttl=30)
+
+    async def run():
+        await mongo_db.orders.insert_one({"order_id": "ORD-1", "status": "processing"})
+        await cache.get("ORD-1")
+        return "ORD-1" in cache._cache
+
+    assert not asyncio.run(run())
+
+
+def test_change_event_invalidates_the_cached_order(mongo_db):
+    cache = OrderCache(mongo_db, ttl=30, watch=True)
+
+    async def run():
+        inserted = await mongo_db.orders.insert_one({"order_id": "ORD-1", "status": "processing"})
+        await cache.get("ORD-1")
+        await mongo_db.orders.update_one({"order_id": "ORD-1"}, {"$set": {"status": "success"}})
+        # What the change stream reports for an update made by another worker
+        await cache._apply_change({"operationType": "update", "documentKey": {"_id": inserted.inserted_id}})
+        return await cache.get("ORD-1")
+
+    assert asyncio.run(run())["status"] == "success"
+
+
+def test_ttl_is_short_unless_invalidation_reaches_every_worker(mongo_db, monkeypatch):
+    monkeypatch.delenv("ORDER_CACHE_TTL", raising=False)
+    monkeypatch.delenv("ORDER_CACHE_CHANGE_STREAM", raising=False)
+    assert OrderCache.from_env(mongo_db)._cache.ttl == 1
+    assert OrderCache.from_env(mongo_db, backend=RedisCacheBackend(FakeRedis())).shared.ttl == 30
+
+    monkeypatch.setenv("ORDER_CACHE_CHANGE_STREAM", "true")
+    assert OrderCache.from_env(mongo_db)._cache.ttl == 30
+
+    monkeypatch.setenv("ORDER_CACHE_TTL", "5")
+    assert OrderCache.from_env(mongo_db)._cache.ttl == 5
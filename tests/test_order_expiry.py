@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from order_expiry import OrderExpirySweeper
+
+
+def overdue(order_id: str, status: str, minutes: int = 1) -> dict:
+    return {
+        "id": f"id-{order_id}",
+        "order_id": order_id,
+        "status": status,
+        "base_amount": 499.0,
+        "unique_amount": 499.37,
+        "payment_window_expires": datetime.now(timezone.utc) - timedelta(minutes=minutes),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.transitions = []
+
+    async def __call__(self, order: dict, status: str):
+        self.transitions.append((order["order_id"], status))
+
+
+async def statuses(db) -> dict:
+    return {order["order_id"]: order["status"] async for order in db.orders.find({})}
+
+
+def test_pending_orders_expire_while_paytm_is_unreachable(mongo_db):
+    checked = []
+
+    async def unreachable(order):
+        checked.append(order["order_id"])
+        return None
+
+    recorder = Recorder()
+    sweeper = OrderExpirySweeper(mongo_db, on_transition=recorder, check_payment=unreachable, batch_size=2)
+
+    async def run():
+        await mongo_db.orders.insert_many([
+            overdue("ORD-P1", "processing", 3), overdue("ORD-P2", "processing", 2), overdue("ORD-1", "pending")
+        ])
+        summaries = [await sweeper.run_once() for _ in range(3)]
+        return summaries, await statuses(mongo_db)
+
+    summaries, stored = asyncio.run(run())
+    assert stored == {"ORD-P1": "processing", "ORD-P2": "processing", "ORD-1": "expired"}
+    assert summaries[0]["expired"] == 1 and summaries[0]["deferred"] == 2
+    # Deferred orders are not re-checked until their retry time
+    assert checked == ["ORD-P1", "ORD-P2"]
+    assert summaries[1]["scanned"] == 0
+    assert recorder.transitions == [("ORD-1", "expired")]
+
+
+def test_final_check_settles_or_expires_processing_orders(mongo_db):
+    answers = {"ORD-PAID": "success", "ORD-OPEN": "pending"}
+
+    async def check(order):
+        # check_order settles the order itself when Paytm has a final answer
+        if answers[order["order_id"]] == "success":
+            await mongo_db.orders.update_one({"order_id": order["order_id"]}, {"$set": {"status": "success"}})
+        return answers[order["order_id"]]
+
+    recorder = Recorder()
+    sweeper = OrderExpirySweeper(mongo_db, on_transition=recorder, check_payment=check)
+
+    async def run():
+        await mongo_db.orders.insert_many([overdue("ORD-PAID", "processing"), overdue("ORD-OPEN", "processing")])
+        return await sweeper.run_once(), await statuses(mongo_db)
+
+    summary, stored = asyncio.run(run())
+    assert stored == {"ORD-PAID": "success", "ORD-OPEN": "expired"}
+    assert summary["settled"] == 1 and summary["expired"] == 1
+    assert recorder.transitions == [("ORD-OPEN", "expired")]
+
+
+def test_orders_inside_their_window_are_left_alone(mongo_db):
+    sweeper = OrderExpirySweeper(mongo_db)
+
+    async def run():
+        await mongo_db.orders.insert_one(overdue("ORD-1", "pending", minutes=-5))
+        return await sweeper.run_once(), await statuses(mongo_db)
+
+    summary, stored = asyncio.run(run())
+    assert summary["expired"] == 0
+    assert stored == {"ORD-1": "pending"}
+
+
+def test_initiate_reports_the_status_the_final_check_settled(server_db, monkeypatch):
+    import server
+
+    async def paid(order):
+        await server_db.orders.update_one({"order_id": order["order_id"]}, {"$set": {"status": "success"}})
+        return "success"
+
+    monkeypatch.setattr(server.order_expiry, "check_payment", paid)
+
+    async def run():
+        await server_db.orders.insert_one(overdue("ORD-1", "processing"))
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/payment/initiate", json={
+                "order_id": "ORD-1", "customer_id": "c1", "customer_email": "c@example.com",
+                "customer_mobile": "9876543210",
+            })
+
+    response = asyncio.run(run())
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Order already success"
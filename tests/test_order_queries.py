@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from order_queries import ORDER_LIST_SORT, after_cursor, decode_cursor, encode_cursor
+
+
+CREATED_AT = datetime(2024, 3, 1, 10, 30, 15, 123000, tzinfo=timezone.utc)
+
+
+def test_cursor_round_trip():
+    order = {"order_id": "ORD-1A2B3C4D", "created_at": CREATED_AT}
+    assert decode_cursor(encode_cursor(order)) == (CREATED_AT, "ORD-1A2B3C4D")
+
+
+def test_cursor_from_naive_datetime_is_utc():
+    order = {"order_id": "ORD-1", "created_at": CREATED_AT.replace(tzinfo=None)}
+    assert decode_cursor(encode_cursor(order))[0] == CREATED_AT
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "eyJjIjogMX0="])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        after_cursor(cursor)
+
+
+def test_pages_cover_every_order_once(mongo_db):
+    # Pairs of orders share a created_at, so pages must break ties on order_id
+    orders = [
+        {"order_id": f"ORD-{n:04d}", "created_at": CREATED_AT + timedelta(seconds=n // 2)}
+        for n in range(25)
+    ]
+
+    async def run():
+        await mongo_db.orders.insert_many([dict(order) for order in orders])
+        seen, query = [], {}
+        while True:
+            page = await mongo_db.orders.find(query, {"_id": 0}).sort(ORDER_LIST_SORT).limit(4).to_list(4)
+            if not page:
+                return seen
+            seen.extend(order["order_id"] for order in page)
+            query = after_cursor(encode_cursor(page[-1]))
+
+    expected = [order["order_id"] for order in sorted(orders, key=lambda o: (o["created_at"], o["order_id"]), reverse=True)]
+    assert asyncio.run(run()) == expected
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+
+from order_stats import OrderStatsRollup
+
+
+CREATED_AT = datetime(2024, 3, 1, 10, 30, tzinfo=timezone.utc)
+
+
+def order(order_id: str, status: str = "pending", product_id: str = "p1", amount: float = 499.37) -> dict:
+    return {
+        "order_id": order_id,
+        "product_id": product_id,
+        "product_name": "P",
+        "status": status,
+        "unique_amount": amount,
+        "created_at": CREATED_AT,
+    }
+
+
+def test_transitions_move_counters_and_revenue(mongo_db):
+    stats = OrderStatsRollup(mongo_db)
+
+    async def run():
+        first, second = order("ORD-1"), order("ORD-2", amount=100.5)
+        await stats.record_created(first)
+        await stats.record_created(second)
+        await stats.record_transition(first, "processing")
+        await stats.record_transition({**first, "status": "processing"}, "success")
+        await stats.record_transition(second, "failed")
+        # A late success settles the failed order
+        await stats.record_transition({**second, "status": "failed"}, "success")
+        return (await stats.summary())["totals"]
+
+    totals = asyncio.run(run())
+    assert (totals["created"], totals["pending"], totals["processing"]) == (2, 0, 0)
+    assert (totals["success"], totals["failed"]) == (2, 0)
+    assert totals["revenue"] == 599.87
+    assert totals["conversion_rate"] == 1.0
+
+
+def test_unchanged_status_is_not_counted(mongo_db):
+    stats = OrderStatsRollup(mongo_db)
+
+    async def run():
+        await stats.record_created(order("ORD-1", "success"))
+        await stats.record_transition(order("ORD-1", "success"), "success")
+        return (await stats.summary())["totals"]
+
+    assert asyncio.run(run())["success"] == 1
+
+
+def test_incremental_rollups_match_a_rebuild(mongo_db):
+    stats = OrderStatsRollup(mongo_db)
+    orders = [order(f"ORD-{n}", product_id=f"p{n % 3}") for n in range(9)]
+
+    async def run():
+        await mongo_db.orders.insert_many([dict(o) for o in orders])
+        await stats.record_created_many(orders)
+        for o in orders[:4]:
+            await stats.record_transition(o, "success")
+            await mongo_db.orders.update_one({"order_id": o["order_id"]}, {"$set": {"status": "success"}})
+        incremental = await stats.summary()
+        await stats.rebuild()
+        return incremental, await stats.summary()
+
+    incremental, rebuilt = asyncio.run(run())
+    assert incremental == rebuilt
+    assert incremental["totals"]["success"] == 4
+
+
+def test_racing_writers_count_each_transition_once(server_db, monkeypatch):
+    import server
+
+    def paytm(request):
+        if "initiateTransaction" in str(request.url):
+            return httpx.Response(200, json={"body": {"resultInfo": {"resultStatus": "S"}, "txnToken": "token"}})
+        return httpx.Response(200, json={"body": {"resultInfo": {"resultStatus": "TXN_SUCCESS"}}})
+
+    monkeypatch.setattr(server.paytm_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(paytm)))
+    monkeypatch.setattr(server, "order_stats", OrderStatsRollup(server_db))
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            created = await client.post("/api/orders", json={"product_id": "p1", "product_name": "P", "amount": 499.0})
+            order_id = created.json()["order_id"]
+            body = {"order_id": order_id, "customer_id": "c1", "customer_email": "c@example.com",
+                    "customer_mobile": "9876543210"}
+            # Two initiates at once, then a status check racing the success callback
+            await asyncio.gather(client.post("/api/payment/initiate", json=body),
+                                 client.post("/api/payment/initiate", json=body))
+            await asyncio.gather(
+                client.get(f"/api/payment/status/{order_id}"),
+                server.apply_payment_callback({"ORDERID": order_id, "TXNID": "T1", "STATUS": "TXN_SUCCESS"}),
+            )
+            reopened = await client.post("/api/payment/initiate", json=body)
+            return reopened, (await server.order_stats.summary())["totals"]
+
+    reopened, totals = asyncio.run(run())
+    assert reopened.status_code == 400
+    assert (totals["created"], totals["pending"], totals["processing"], totals["success"]) == (1, 0, 0, 1)
+    assert totals["revenue"] > 499
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import server
+from checksum_pool import PaytmChecksum
+from server import PAYTM_KEY, Order, apply_payment_callback
+
+
+def callback(order_id: str, status: str) -> dict:
+    return {"ORDERID": order_id, "TXNID": f"TXN-{order_id}", "STATUS": status, "RESPMSG": "test"}
+
+
+async def insert_order(db, status: str) -> str:
+    order = Order(
+        product_id="p1",
+        product_name="P",
+        base_amount=499.0,
+        unique_amount=499.37,
+        status=status,
+        payment_window_expires=datetime.now(timezone.utc) + timedelta(minutes=5),
+    )
+    await db.orders.insert_one(order.model_dump())
+    return order.order_id
+
+
+@pytest.mark.parametrize("before, reported, after", [
+    ("pending", "TXN_SUCCESS", "success"),
+    ("processing", "TXN_SUCCESS", "success"),
+    ("processing", "TXN_FAILURE", "failed"),
+    ("pending", "TXN_FAILURE", "failed"),
+    # A late success still settles an order that failed or expired while the customer was paying
+    ("failed", "TXN_SUCCESS", "success"),
+    ("expired", "TXN_SUCCESS", "success"),
+    # A failure can never undo a success, or reopen an expired order
+    ("success", "TXN_FAILURE", "success"),
+    ("expired", "TXN_FAILURE", "expired"),
+    ("success", "TXN_SUCCESS", "success"),
+    # PENDING has no outcome yet: the order stays open for a later callback or the reconciler
+    ("pending", "PENDING", "processing"),
+    ("processing", "PENDING", "processing"),
+    ("failed", "PENDING", "failed"),
+])
+def test_callback_transitions(server_db, before, reported, after):
+    async def run():
+        order_id = await insert_order(server_db, before)
+        result = await apply_payment_callback(callback(order_id, reported))
+        return result, await server_db.orders.find_one({"order_id": order_id})
+
+    result, stored = asyncio.run(run())
+    assert result == after
+    assert stored["status"] == after
+    if before != after and after == "success":
+        assert stored["payment_gateway_txn_id"] == f"TXN-{stored['order_id']}"
+
+
+def test_refused_transition_keeps_the_gateway_response(server_db):
+    async def run():
+        order_id = await insert_order(server_db, "processing")
+        await apply_payment_callback(callback(order_id, "TXN_SUCCESS"))
+        await apply_payment_callback(callback(order_id, "TXN_FAILURE"))
+        return await server_db.orders.find_one({"order_id": order_id})
+
+    stored = asyncio.run(run())
+    assert stored["status"] == "success"
+    assert stored["gateway_response"]["STATUS"] == "TXN_SUCCESS"
+
+
+def test_unknown_order(server_db):
+    assert asyncio.run(apply_payment_callback(callback("ORD-MISSING", "TXN_SUCCESS"))) is None
+
+
+def test_transition_invalidates_cached_status(server_db):
+    async def run():
+        order_id = await insert_order(server_db, "processing")
+        await server.payment_status_cache.set(order_id, {"status": "PENDING"})
+        await apply_payment_callback(callback(order_id, "TXN_SUCCESS"))
+        return await server.payment_status_cache.get(order_id)
+
+    assert asyncio.run(run()) is None
+
+
+def test_success_after_pending_callback_is_applied(server_db, monkeypatch):
+    """Paytm may send PENDING and then TXN_SUCCESS for the same transaction"""
+    monkeypatch.setattr(server, "PAYTM_CALLBACK_MODE", "inline")
+
+    async def post(client, params):
+        signed = {**params, "CHECKSUMHASH": PaytmChecksum.generateSignature(params, PAYTM_KEY)}
+        return await client.post("/api/payment/callback", data=signed)
+
+    async def run():
+        order_id = await insert_order(server_db, "processing")
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await post(client, callback(order_id, "PENDING"))
+            response = await post(client, callback(order_id, "TXN_SUCCESS"))
+        return response, await server_db.orders.find_one({"order_id": order_id})
+
+    response, stored = asyncio.run(run())
+    assert stored["status"] == "success"
+    assert "/payment-success" in response.headers["location"]
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from reconciler import PaymentReconciler
+
+
+def paytm_answer(result_status: str) -> dict:
+    return {"success": True, "data": {"body": {"resultInfo": {"resultStatus": result_status}}}}
+
+
+class FakePaytm:
+    def __init__(self, answers: dict):
+        self.answers = answers
+        self.calls = []
+
+    async def __call__(self, order_id: str) -> dict:
+        self.calls.append(order_id)
+        await asyncio.sleep(0)
+        answer = self.answers.get(order_id, "PENDING")
+        if answer is None:
+            return {"success": False, "error": "Paytm unavailable"}
+        return paytm_answer(answer)
+
+
+async def insert_processing(db, count: int):
+    await db.orders.insert_many([
+        {"id": f"id-{n}", "order_id": f"ORD-{n}", "status": "processing", "base_amount": 499.0, "unique_amount": 499.37}
+        for n in range(count)
+    ])
+
+
+def test_workers_never_check_the_same_order(mongo_db):
+    paytm = FakePaytm({})
+    workers = [PaymentReconciler(mongo_db, paytm, batch_size=6) for _ in range(3)]
+
+    async def run():
+        await insert_processing(mongo_db, 10)
+        return await asyncio.gather(*[worker.run_once() for worker in workers])
+
+    summaries = asyncio.run(run())
+    assert sorted(paytm.calls) == sorted(f"ORD-{n}" for n in range(10))
+    assert sum(summary["scanned"] for summary in summaries) == 10
+
+
+def test_pending_orders_back_off(mongo_db):
+    paytm = FakePaytm({})
+    reconciler = PaymentReconciler(mongo_db, paytm, base_backoff=15)
+
+    async def run():
+        await insert_processing(mongo_db, 1)
+        first = await reconciler.run_once()
+        # Not due again until the backoff has passed
+        second = await reconciler.run_once()
+        return first, second, await mongo_db.orders.find_one({"order_id": "ORD-0"})
+
+    first, second, stored = asyncio.run(run())
+    assert first["pending"] == 1
+    assert second["scanned"] == 0
+    assert stored["reconcile_attempts"] == 1
+    delay = (stored["reconcile_next_at"] - datetime.now(timezone.utc)).total_seconds()
+    assert 10 < delay <= 18
+
+
+def test_final_answers_settle_and_report_transitions(mongo_db):
+    transitions = []
+
+    async def on_transition(order, status):
+        transitions.append((order["order_id"], order["status"], status))
+
+    paytm = FakePaytm({"ORD-0": "TXN_SUCCESS", "ORD-1": "TXN_FAILURE"})
+    reconciler = PaymentReconciler(mongo_db, paytm, on_transition=on_transition)
+
+    async def run():
+        await insert_processing(mongo_db, 3)
+        summary = await reconciler.run_once()
+        stored = {order["order_id"]: order async for order in mongo_db.orders.find({})}
+        return summary, stored
+
+    summary, stored = asyncio.run(run())
+    assert (summary["success"], summary["failed"], summary["pending"]) == (1, 1, 1)
+    assert stored["ORD-0"]["status"] == "success" and "reconcile_next_at" not in stored["ORD-0"]
+    assert stored["ORD-1"]["status"] == "failed"
+    assert stored["ORD-2"]["status"] == "processing"
+    assert sorted(transitions) == [("ORD-0", "processing", "success"), ("ORD-1", "processing", "failed")]
+
+
+def test_order_settled_elsewhere_is_not_overwritten(mongo_db):
+    async def callback_wins(order_id):
+        # The callback lands while Paytm is being asked
+        await mongo_db.orders.update_one({"order_id": order_id}, {"$set": {"status": "success"}})
+        return paytm_answer("TXN_FAILURE")
+
+    reconciler = PaymentReconciler(mongo_db, callback_wins)
+
+    async def run():
+        await insert_processing(mongo_db, 1)
+        return await reconciler.run_once(), await mongo_db.orders.find_one({"order_id": "ORD-0"})
+
+    summary, stored = asyncio.run(run())
+    assert summary["failed"] == 0
+    assert stored["status"] == "success"
+
+
+def test_expired_claim_is_picked_up_again(mongo_db):
+    paytm = FakePaytm({})
+    reconciler = PaymentReconciler(mongo_db, paytm)
+
+    async def run():
+        await insert_processing(mongo_db, 1)
+        # A worker claimed the order and died before writing its backoff
+        await mongo_db.orders.update_one({"order_id": "ORD-0"}, {"$set": {
+            "reconcile_claim": "dead-worker",
+            "reconcile_next_at": datetime.now(timezone.utc) - timedelta(seconds=1),
+        }})
+        return await reconciler.run_once()
+
+    assert asyncio.run(run())["scanned"] == 1
+    assert paytm.calls == ["ORD-0"]
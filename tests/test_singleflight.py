@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"status": "success"}
+
+    async def run():
+        return await asyncio.gather(*[flight.do("ORD-1", load) for _ in range(10)])
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"executions": 1, "shared": 9, "in_flight": 0}
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    async def run():
+        async def load(key):
+            await asyncio.sleep(0.01)
+            return key
+        return await asyncio.gather(*[flight.do(key, lambda key=key: load(key)) for key in ("a", "b", "a")])
+
+    assert asyncio.run(run()) == ["a", "b", "a"]
+    assert flight.executions == 2
+
+
+def test_error_reaches_every_caller():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Paytm unavailable")
+
+    async def run():
+        return await asyncio.gather(*[flight.do("ORD-1", load) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [type(result) for result in results] == [RuntimeError] * 3
+    assert flight.executions == 1
+
+
+def test_key_is_retried_after_a_failure():
+    flight = SingleFlight()
+    attempts = []
+
+    async def load():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("first attempt fails")
+        return "ok"
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await flight.do("ORD-1", load)
+        return await flight.do("ORD-1", load)
+
+    assert asyncio.run(run()) == "ok"
+    assert flight.executions == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("ORD-1", load))
+        second = asyncio.ensure_future(flight.do("ORD-1", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"